@@ -0,0 +1,280 @@
+# benchmarks/bench_api.py
+#
+# End-to-end latency of the FastAPI endpoints in main.py under concurrent load, fully
+# offline: the SentenceTransformer and the llama.cpp generator are replaced by the
+# stand-ins in benchmarks/stand_ins.py, and requests go through the ASGI app in-process
+# (no sockets), so the numbers cover the pipeline's own overhead. By default a synthetic
+# Spider-format catalog with SQLite databases is generated; --tables/--db-dir use a real one.
+#
+#   python benchmarks/bench_api.py --concurrency 16 --requests 2000 --save baseline
+#   python benchmarks/bench_api.py --concurrency 16 --requests 2000 --compare benchmarks/baselines/baseline.json
+#
+# --model-server runs the stand-ins in a separate models/model_server.py process and has
+# the app reach them over its Unix socket, measuring the IPC overhead of that deployment.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+
+WORDS = ["singer", "concert", "stadium", "student", "course", "teacher", "employee", "department", "order",
+         "product", "customer", "flight", "airport", "airline", "movie", "actor", "book", "author", "hospital",
+         "doctor", "patient", "city", "country", "team", "player", "game", "school", "club", "ship", "captain"]
+ATTRIBUTES = ["name", "age", "year", "country", "city", "price", "rating", "capacity", "salary", "title",
+              "budget", "population", "score", "height", "weight", "date", "status", "type", "code", "level"]
+
+ENDPOINTS = ["match_schema", "generate_sql", "generate_sql_stream", "execute_query", "execute_query_stream",
+             "stats"]
+
+
+def build_catalog(out_dir: str, n_dbs: int, rows: int, seed: int):
+    """Spider-format tables.json plus one SQLite file per database; returns (tables_path, db_dir)."""
+    rng = random.Random(seed)
+    db_dir = os.path.join(out_dir, "database")
+    catalog = []
+    for d in range(n_dbs):
+        db_id = f"{rng.choice(WORDS)}_{d}"
+        tables = rng.sample(WORDS, rng.randint(2, 5))
+        columns, types, foreign_keys = [[-1, "*"]], ["text"], []
+        for t, table in enumerate(tables):
+            columns.append([t, f"{table}_id"])
+            types.append("number")
+            for attribute in rng.sample(ATTRIBUTES, rng.randint(2, 6)):
+                columns.append([t, attribute])
+                types.append("number" if attribute in ("age", "year", "price", "salary", "score") else "text")
+            if t:
+                columns.append([t, f"{tables[0]}_id"])
+                types.append("number")
+                foreign_keys.append([len(columns) - 1, 1])
+        catalog.append({"db_id": db_id, "table_names_original": tables, "table_names": tables,
+                        "column_names_original": columns, "column_names": columns, "column_types": types,
+                        "foreign_keys": foreign_keys, "primary_keys": []})
+
+        os.makedirs(os.path.join(db_dir, db_id), exist_ok=True)
+        conn = sqlite3.connect(os.path.join(db_dir, db_id, f"{db_id}.sqlite"))
+        for t, table in enumerate(tables):
+            cols = [(name, kind) for (ti, name), kind in zip(columns, types) if ti == t]
+            conn.execute(f'CREATE TABLE "{table}" ({", ".join(f"{c} {k}" for c, k in cols)})')
+            conn.executemany(
+                f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in cols)})',
+                [[r if k == "number" else f"{c}-{r}" for c, k in cols] for r in range(rows)])
+        conn.commit()
+        conn.close()
+
+    tables_path = os.path.join(out_dir, "tables.json")
+    with open(tables_path, "w") as f:
+        json.dump(catalog, f)
+    return tables_path, db_dir
+
+
+def build_workload(tables_path: str, n: int, seed: int):
+    """Questions and SELECTs drawn from the catalog's table and column names."""
+    with open(tables_path) as f:
+        catalog = json.load(f)
+    rng = random.Random(seed)
+    templates = ["How many {table} have {col} above the average?", "List the {col} of every {table}.",
+                 "What is the {col} of the {table} with the highest {col2}?", "Show {table} {col} by {col2}."]
+    questions, queries = [], []
+    for _ in range(n):
+        db = rng.choice(catalog)
+        t = rng.randrange(len(db["table_names_original"]))
+        cols = [name for ti, name in db["column_names_original"] if ti == t]
+        col, col2 = rng.choice(cols), rng.choice(cols)
+        table = db["table_names_original"][t]
+        questions.append(rng.choice(templates).format(table=table, col=col, col2=col2))
+        queries.append((db["db_id"], f'SELECT {col}, {col2} FROM "{table}" WHERE {col2} IS NOT NULL LIMIT 50'))
+    return questions, queries
+
+
+def serve_stand_ins(socket_path: str, seed: int, prefill_ms: float, token_ms: float, generators: int,
+                    max_queue: int):
+    """Child-process entry point: a ModelServer around the stand-in models."""
+    from models.model_server import ModelServer
+    from stand_ins import FakeSQLGenerator, RandomProjectionEncoder
+
+    ModelServer(socket_path, RandomProjectionEncoder(seed=seed), "random-projection",
+                generators=[FakeSQLGenerator(prefill_ms, token_ms) for _ in range(generators)],
+                max_queue=max_queue).serve_forever()
+
+
+def start_model_server(socket_path: str, args) -> multiprocessing.Process:
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve_stand_ins, daemon=True,
+        args=(socket_path, args.seed, args.prefill_ms, args.token_ms,
+              max(1, int(os.getenv("SQL_GEN_CONCURRENCY", "1"))), args.concurrency))
+    process.start()
+    deadline = time.monotonic() + 30
+    while not os.path.exists(socket_path):
+        if not process.is_alive() or time.monotonic() > deadline:
+            raise SystemExit("Model server did not start")
+        time.sleep(0.05)
+    return process
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def drive(client, endpoint: str, workload, concurrency: int):
+    questions, queries = workload
+    latencies, errors = [], 0
+    counter = iter(range(len(questions)))
+
+    async def one(i):
+        if endpoint == "match_schema":
+            return await client.post("/match_schema/", json={"question": questions[i]})
+        if endpoint == "generate_sql":
+            return await client.post("/generate-sql/", json={"question": questions[i]})
+        if endpoint == "generate_sql_stream":
+            return await client.post("/generate-sql/stream", json={"question": questions[i]})
+        if endpoint == "execute_query":
+            db_id, sql = queries[i]
+            return await client.post("/execute-query", json={"query": sql, "db_id": db_id})
+        if endpoint == "execute_query_stream":
+            db_id, sql = queries[i]
+            return await client.post("/execute-query", json={"query": sql, "db_id": db_id, "stream": True})
+        return await client.get("/stats")
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await one(i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressed = False
+    print(f"\ncompared with {baseline_path} (tolerance {tolerance:.0%}):")
+    for endpoint, current in results.items():
+        before = baseline.get(endpoint)
+        if not before:
+            continue
+        throughput = current["throughput_rps"] / before["throughput_rps"] - 1
+        p99 = current["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+        flag = throughput < -tolerance or p99 > tolerance
+        regressed |= flag
+        print(f"{endpoint:>22}: throughput {throughput:+7.1%}, p99 {p99:+7.1%}{'  REGRESSION' if flag else ''}")
+    return not regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", default=None, help="Spider tables.json (default: generate a synthetic catalog)")
+    parser.add_argument("--db-dir", default=None)
+    parser.add_argument("--dbs", type=int, default=200, help="databases in the synthetic catalog")
+    parser.add_argument("--rows", type=int, default=500, help="rows per synthetic table")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint")
+    parser.add_argument("--prefill-ms", type=float, default=0.0, help="simulated LLM prefill time")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="simulated LLM time per output token")
+    parser.add_argument("--with-caches", action="store_true", help="keep the SQL and result caches enabled")
+    parser.add_argument("--model-server", action="store_true", help="serve the stand-ins from a model-server process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", default=None, help="write results to benchmarks/baselines/<name>.json")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_api_")
+    tables_path, db_dir = args.tables, args.db_dir
+    if tables_path is None:
+        tables_path, db_dir = build_catalog(work_dir, args.dbs, args.rows, args.seed)
+
+    # main.py reads its configuration at import time.
+    os.environ.update({"TABLES_PATH": tables_path, "SQLITE_DB_DIR": db_dir or "", "WARMUP_MODELS": ""})
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.with_caches:
+        os.environ.update({"SQL_CACHE_SIZE": "0", "RESULT_CACHE_MB": "0"})
+    if args.model_server:
+        socket_path = os.path.join(work_dir, "models.sock")
+        start_model_server(socket_path, args)
+        os.environ.update({"MODEL_SERVER_SOCKET": socket_path,
+                           "MODEL_SERVER_MAX_INFLIGHT": str(args.concurrency)})
+    os.chdir(ROOT)
+    import httpx
+    import main as api
+    from models.inference_queue import InferenceQueue
+    from models.model_server import RemoteSQLGenerator
+    from models.schema_matcher import SchemaMatcher
+    from stand_ins import FakeSQLGenerator, RandomProjectionEncoder
+
+    if args.model_server:
+        # The app's own model-server wiring, with the index kept out of artifacts/.
+        api.registry.register("schema_matcher", lambda: SchemaMatcher(
+            tables_path, catalog=api.schemas.catalog, model_name=api.model_client.model_name,
+            index_dir=os.path.join(work_dir, "index"), model=api.model_client))
+        api.registry.register("sql_generator", lambda: InferenceQueue(
+            [RemoteSQLGenerator(api.model_client) for _ in range(args.concurrency)],
+            max_queue=max(api.SQL_GEN_MAX_QUEUE, args.concurrency)))
+    else:
+        api.registry.register("schema_matcher", lambda: SchemaMatcher(
+            tables_path, catalog=api.schemas.catalog, model_name="random-projection",
+            index_dir=os.path.join(work_dir, "index"), model=RandomProjectionEncoder(seed=args.seed),
+            batch_max_size=api.EMBED_BATCH_MAX_SIZE, batch_max_wait_ms=api.EMBED_BATCH_MAX_WAIT_MS))
+        api.registry.register("sql_generator", lambda: InferenceQueue(
+            [FakeSQLGenerator(args.prefill_ms, args.token_ms) for _ in range(max(1, api.SQL_GEN_CONCURRENCY))],
+            max_queue=max(api.SQL_GEN_MAX_QUEUE, args.concurrency)))
+    api.registry.warmup()
+    failed = {name: s["error"] for name, s in api.registry.status().items() if s["error"]}
+    if failed:
+        raise SystemExit(f"Model stand-ins failed to load: {failed}")
+
+    workload = build_workload(tables_path, args.requests, args.seed)
+
+    async def run_all():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            results = {}
+            for endpoint in args.endpoints:
+                results[endpoint] = await drive(client, endpoint, workload, args.concurrency)
+                r = results[endpoint]
+                print(f"{endpoint:>22}: {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:7.2f} ms  "
+                      f"p95 {r['p95_ms']:7.2f} ms  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+            return results
+
+    print(f"concurrency {args.concurrency}, {args.requests} requests per endpoint, catalog {tables_path}")
+    results = asyncio.run(run_all())
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "results": results}, f, indent=2)
+        print(f"✅ Saved baseline to {path}")
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
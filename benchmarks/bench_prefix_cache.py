@@ -0,0 +1,72 @@
+# benchmarks/bench_prefix_cache.py
+#
+# Time-to-first-token of SQLGenerator with and without the schema prefix KV cache.
+# Traffic rotates over --dbs databases so consecutive requests never share a prefix,
+# which is the case llama.cpp's own "same prompt as last time" reuse cannot help with.
+#   python benchmarks/bench_prefix_cache.py --tables data/spider/tables.json --dbs 8 --rounds 5
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.generator_llm import SQLGenerator
+from models.prefix_cache import PrefixKVCache
+from utils.prompt_formatter import format_schema_prompt
+from utils.schema_parser import load_parsed_schema
+
+
+def build_workload(tables_path, n_dbs, rounds):
+    schemas = load_parsed_schema(tables_path)
+    db_ids = sorted(schemas)[:n_dbs]
+    workload = []
+    for r in range(rounds):
+        for db_id in db_ids:
+            schema = schemas[db_id]
+            table = schema["tables"][r % len(schema["tables"])]
+            workload.append((format_schema_prompt(schema), f"How many rows are in the {table} table?"))
+    return workload
+
+
+def time_to_first_token(generator, schema, question):
+    start = time.perf_counter()
+    stream = generator.generate_stream(question=question, schema=schema)
+    next(stream)
+    ttft = time.perf_counter() - start
+    for _ in stream:
+        pass
+    return ttft * 1000
+
+
+def run(generator, workload, label):
+    latencies = [time_to_first_token(generator, schema, question) for schema, question in workload]
+    warm = latencies[len(latencies) // 2:]
+    print(f"{label:>10}: mean {statistics.mean(latencies):8.1f} ms | "
+          f"p50 {statistics.median(latencies):8.1f} ms | warm-half p50 {statistics.median(warm):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", default="data/spider/tables.json")
+    parser.add_argument("--dbs", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--cache-mb", type=int, default=2048)
+    args = parser.parse_args()
+
+    workload = build_workload(args.tables, args.dbs, args.rounds)
+    generator = SQLGenerator()
+
+    generator.prefix_cache = None
+    run(generator, workload, "no cache")
+
+    generator.prefix_cache = PrefixKVCache(args.cache_mb * 1024 * 1024)
+    generator.model.reset()
+    run(generator, workload, "cache")
+    print(generator.prefix_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
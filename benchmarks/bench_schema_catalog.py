@@ -0,0 +1,55 @@
+# benchmarks/bench_schema_catalog.py
+#
+# Load time of the schema catalog from tables.json (JSON parse + every rendering)
+# versus its snapshot, and the cost of the per-request renderings before and
+# after memoization.
+#
+#   python benchmarks/bench_schema_catalog.py --tables data/spider/tables.json
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.fine_grained_schema import get_fine_grained_schema
+from utils.schema_catalog import SchemaCatalog
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", default="data/spider/tables.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    snapshot_dir = tempfile.mkdtemp(prefix="bench_catalog_")
+    cold, catalog = timed(lambda: SchemaCatalog.from_file(args.tables, snapshot_dir=None), args.repeat)
+    SchemaCatalog.from_file(args.tables, snapshot_dir=snapshot_dir)
+    warm, _ = timed(lambda: SchemaCatalog.from_file(args.tables, snapshot_dir=snapshot_dir), args.repeat)
+    print(f"{len(catalog)} databases")
+    print(f"build from JSON:    {cold * 1000:8.1f} ms")
+    print(f"load from snapshot: {warm * 1000:8.1f} ms  ({cold / warm:.1f}x)")
+
+    db_ids = catalog.db_ids
+    rebuild, _ = timed(lambda: [get_fine_grained_schema(catalog.raw[db_id]) for db_id in db_ids], args.repeat)
+    for db_id in db_ids:
+        catalog.tagged_tables(db_id)
+        catalog.schema_prompt(db_id)
+    lookup, _ = timed(lambda: [(catalog.fine_grained_texts[db_id], catalog.tagged_tables(db_id),
+                                catalog.schema_prompt(db_id)) for db_id in db_ids], args.repeat)
+    print(f"fine-grained text per request, rebuilt: {rebuild / len(db_ids) * 1e6:8.1f} µs")
+    print(f"all renderings per request, memoized:   {lookup / len(db_ids) * 1e6:8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
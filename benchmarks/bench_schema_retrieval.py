@@ -0,0 +1,69 @@
+# benchmarks/bench_schema_retrieval.py
+#
+# Lookup latency of exact vs IVF schema retrieval on synthetic, clustered embeddings.
+#   python benchmarks/bench_schema_retrieval.py --sizes 100 10000 100000 --k 5
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.ann_index import IVFIndex, top_k
+from models.schema_index import normalize_rows
+
+
+def make_catalog(n_rows, dim, rng, n_topics=256):
+    """Schemas drawn around a few hundred topics, which is closer to real catalogs than uniform noise."""
+    noise = 0.8 / np.sqrt(dim)
+    topics = normalize_rows(rng.standard_normal((n_topics, dim)))
+    rows = topics[rng.integers(0, n_topics, n_rows)] + noise * rng.standard_normal((n_rows, dim))
+    queries = topics[rng.integers(0, n_topics, 200)] + noise * rng.standard_normal((200, dim))
+    return normalize_rows(rows), normalize_rows(queries)
+
+
+def time_queries(search, queries):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(search(q))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'schemas':>8} {'method':>12} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+    for n_rows in args.sizes:
+        embeddings, queries = make_catalog(n_rows, args.dim, rng)
+
+        exact_lat, exact = time_queries(lambda q: top_k(embeddings @ q, args.k)[0], queries)
+        print(f"{n_rows:>8} {'exact':>12} {np.percentile(exact_lat, 50):>8.3f} "
+              f"{np.percentile(exact_lat, 95):>8.3f} {1.0:>9.3f}")
+
+        start = time.perf_counter()
+        ivf = IVFIndex(embeddings)
+        build_s = time.perf_counter() - start
+        for n_probe in args.probes:
+            if n_probe > ivf.n_lists:
+                continue
+            lat, approx = time_queries(lambda q: ivf.search(q, args.k, n_probe=n_probe)[0], queries)
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)])
+            print(f"{n_rows:>8} {f'ivf p={n_probe}':>12} {np.percentile(lat, 50):>8.3f} "
+                  f"{np.percentile(lat, 95):>8.3f} {recall:>9.3f}")
+        print(f"{'':>8} (ivf: {ivf.n_lists} lists, built in {build_s:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_sql_postchecker.py
+#
+# Per-query cost of the precompiled SchemaValidator vs. the previous validator (schema
+# sets rebuilt per call, recursive walk of the sqlparse tree), over a few thousand
+# queries generated from tables.json: joins along foreign keys with aliases, aggregates,
+# filters, and a share of queries with misspelled columns or wrong qualifiers.
+# Queries can also come from a predictions.sql file (db_id<TAB>sql per line).
+#   python benchmarks/bench_sql_postchecker.py --tables data/spider/tables.json --n 5000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.schema_parser import load_parsed_schema
+from utils.sql_postchecker import SchemaValidatorCache, get_tables_and_columns_from_sql
+
+
+def legacy_validate(sql, db_schema):
+    tables_in_sql, columns_in_sql = get_tables_and_columns_from_sql(sql)
+    schema_tables = set(table.lower() for table in db_schema["tables"])
+    schema_columns = set()
+    for cols in db_schema["table_columns"].values():
+        for col in cols:
+            schema_columns.add(col.lower())
+    return tables_in_sql.issubset(schema_tables) and columns_in_sql.issubset(schema_columns)
+
+
+def quote(name):
+    return f'"{name}"' if not name.replace("_", "").isalnum() else name
+
+
+def generate_query(rng, schema):
+    tables = [t for t in schema["tables"] if schema["table_columns"][t]]
+    links = [(fk["from"].split("."), fk["to"].split(".")) for fk in schema["foreign_keys"]]
+    broken = rng.random() < 0.2
+
+    if links and rng.random() < 0.5:
+        (t1, c1), (t2, c2) = rng.choice(links)
+        col = rng.choice(schema["table_columns"][t2])
+        if broken:
+            col += "_x"
+        return (f"SELECT T2.{quote(col)}, count(*) AS cnt FROM {quote(t1)} AS T1 JOIN {quote(t2)} AS T2 "
+                f"ON T1.{quote(c1)} = T2.{quote(c2)} GROUP BY T2.{quote(col)} ORDER BY cnt DESC LIMIT 5")
+
+    table = rng.choice(tables)
+    cols = rng.sample(schema["table_columns"][table], min(3, len(schema["table_columns"][table])))
+    where = cols[-1] + ("_x" if broken else "")
+    agg = rng.choice(["", "max", "min", "count"])
+    select = ", ".join(quote(c) for c in cols[:-1] or cols)
+    if agg:
+        select = f"{agg}({quote(cols[0])})"
+    return f"SELECT {select} FROM {quote(table)} WHERE {quote(where)} = 'value'"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", default="data/spider/tables.json")
+    parser.add_argument("--queries", default=None, help="predictions.sql-style file instead of generated queries")
+    parser.add_argument("--n", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    schemas = load_parsed_schema(args.tables)
+    if args.queries:
+        with open(args.queries) as f:
+            workload = [tuple(line.rstrip("\n").split("\t", 1)) for line in f if "\t" in line]
+    else:
+        rng = random.Random(args.seed)
+        db_ids = sorted(schemas)
+        workload = []
+        for _ in range(args.n):
+            db_id = rng.choice(db_ids)
+            workload.append((db_id, generate_query(rng, schemas[db_id])))
+
+    start = time.perf_counter()
+    legacy = [legacy_validate(sql, schemas[db_id]) for db_id, sql in workload]
+    legacy_s = time.perf_counter() - start
+
+    validators = SchemaValidatorCache()
+    start = time.perf_counter()
+    compiled = [validators.get(db_id, schemas[db_id]).validate(sql) for db_id, sql in workload]
+    compiled_s = time.perf_counter() - start
+
+    n = len(workload)
+    print(f"{n} queries over {len({db_id for db_id, _ in workload})} databases")
+    print(f"  legacy validator:   {legacy_s / n * 1e6:8.1f} us/query, accepted {sum(legacy) / n:.1%}")
+    print(f"  compiled validator: {compiled_s / n * 1e6:8.1f} us/query, accepted {sum(compiled) / n:.1%} "
+          f"({legacy_s / compiled_s:.1f}x)")
+    print(f"  verdicts differ on {sum(a != b for a, b in zip(legacy, compiled))} queries")
+
+
+if __name__ == "__main__":
+    main()
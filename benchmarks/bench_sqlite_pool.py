@@ -0,0 +1,99 @@
+# benchmarks/bench_sqlite_pool.py
+#
+# Requests/sec of pooled SQLite connections vs. the old connect-per-request path of
+# /execute-query, on a generated database.
+#   python benchmarks/bench_sqlite_pool.py --rows 200000 --requests 2000 --threads 4
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db_pool import SQLitePool
+
+QUERIES = [
+    "SELECT name, age FROM singer WHERE singer_id = {n}",
+    "SELECT count(*) FROM singer WHERE age > {a}",
+    "SELECT country, avg(age) FROM singer WHERE singer_id BETWEEN {n} AND {n} + 500 GROUP BY country",
+]
+
+
+def build_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE singer (singer_id INTEGER PRIMARY KEY, name TEXT, country TEXT, age INTEGER)")
+    rng = random.Random(0)
+    countries = ["France", "Japan", "Brazil", "Kenya", "Canada", "India"]
+    conn.executemany(
+        "INSERT INTO singer VALUES (?, ?, ?, ?)",
+        ((i, f"singer {i}", rng.choice(countries), rng.randint(18, 80)) for i in range(rows)),
+    )
+    conn.execute("CREATE INDEX singer_age ON singer (age)")
+    conn.commit()
+    conn.close()
+
+
+def workload(n_requests, rows):
+    rng = random.Random(1)
+    return [rng.choice(QUERIES).format(n=rng.randrange(rows), a=rng.randint(18, 80)) for _ in range(n_requests)]
+
+
+def connect_per_request(path):
+    def run(sql):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+    return run
+
+
+def pooled(pool):
+    def run(sql):
+        with pool.connection() as conn:
+            cursor = conn.execute(sql)
+            try:
+                return [dict(row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    return run
+
+
+def measure(label, run, queries, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(run, queries))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>20}: {len(queries) / elapsed:10.1f} req/s ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        build_database(path, args.rows)
+        queries = workload(args.requests, args.rows)
+
+        measure("connect-per-request", connect_per_request(path), queries, args.threads)
+        pool = SQLitePool(default_path=path, size=args.threads)
+        measure("pooled", pooled(pool), queries, args.threads)
+        print(pool.stats())
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/bench_startup.py
+#
+# API startup cost: time to import main.py (all models lazy), time until a cheap endpoint
+# answers, and per-model load times from the registry when warmed up. Each run is a fresh
+# interpreter so imports and model loads are cold.
+#   python benchmarks/bench_startup.py --runs 3 --warmup schema_matcher subschema_index
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/stats")
+    first_response = time.perf_counter() - start
+    main.registry.warmup(json.loads(sys.argv[1]))
+    status = main.registry.status()
+print(json.dumps({"import_s": imported, "first_response_s": first_response,
+                  "load_s": {name: s["load_seconds"] for name, s in status.items() if s["loaded"]},
+                  "errors": {name: s["error"] for name, s in status.items() if s["error"]}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warmup", nargs="*", default=[], help="registry names to load after startup")
+    args = parser.parse_args()
+
+    env = dict(os.environ, WARMUP_MODELS="")
+    results = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", CHILD, json.dumps(args.warmup)], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"import main.py:       {statistics.median(r['import_s'] for r in results):7.2f}s (median of {args.runs})")
+    print(f"first /stats answer:  {statistics.median(r['first_response_s'] for r in results):7.2f}s")
+    for name in args.warmup:
+        loads = [r["load_s"][name] for r in results if name in r["load_s"]]
+        if loads:
+            print(f"load {name + ':':<16} {statistics.median(loads):7.2f}s")
+        else:
+            print(f"load {name + ':':<16} failed ({results[-1]['errors'].get(name)})")
+
+
+if __name__ == "__main__":
+    main()
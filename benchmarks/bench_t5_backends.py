@@ -0,0 +1,102 @@
+# benchmarks/bench_t5_backends.py
+#
+# Load time, per-question latency and accuracy of the T5 inference backends on a fixed
+# Spider sample (same seed, same questions for every backend). Accuracy is exact match
+# against the gold SQL after whitespace/case normalization, execution match when
+# --db-dir points at the Spider databases, and agreement with the fp32 torch output.
+#   python export_text2sql_model.py --onnx
+#   python benchmarks/bench_t5_backends.py --dev data/spider/dev.json --tables data/spider/tables.json \
+#       --db-dir data/spider/database --n 200 --backends torch int8 onnx
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.schema_parser import load_parsed_schema
+from bench_t5_batch import tagged_schema
+
+
+def normalize(sql):
+    return " ".join(sql.lower().replace(";", " ").split())
+
+
+def execute(db_dir, db_id, sql):
+    try:
+        conn = sqlite3.connect(f"file:{os.path.join(db_dir, db_id, db_id + '.sqlite')}?mode=ro", uri=True)
+        try:
+            return sorted(map(repr, conn.execute(sql).fetchall()))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dev", default="data/spider/dev.json")
+    parser.add_argument("--tables", default="data/spider/tables.json")
+    parser.add_argument("--db-dir", default=None)
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"])
+    args = parser.parse_args()
+
+    import utils_text2sql
+
+    with open(args.dev) as f:
+        examples = json.load(f)
+    random.Random(args.seed).shuffle(examples)
+    examples = examples[:args.n]
+    schemas = load_parsed_schema(args.tables)
+    golds = [ex["query"] for ex in examples]
+    gold_results = [execute(args.db_dir, ex["db_id"], ex["query"]) for ex in examples] if args.db_dir else None
+
+    start = time.perf_counter()
+    utils_text2sql.load_pickled_model()
+    print(f"pickled checkpoint load: {time.perf_counter() - start:.2f}s")
+
+    reference = None
+    for backend in args.backends:
+        start = time.perf_counter()
+        try:
+            utils_text2sql.load_model(backend)
+        except (ImportError, FileNotFoundError) as e:
+            print(f"{backend:>6}: skipped ({e})")
+            continue
+        load_s = time.perf_counter() - start
+
+        predictions, latencies = [], []
+        for ex in examples:
+            start = time.perf_counter()
+            predictions.append(utils_text2sql.generate_sql(tagged_schema(schemas[ex["db_id"]]), ex["question"],
+                                                           backend=backend))
+            latencies.append((time.perf_counter() - start) * 1000)
+        if backend == "torch":
+            reference = predictions
+
+        line = (f"{backend:>6}: load {load_s:6.2f}s, latency p50 {statistics.median(latencies):7.1f} ms "
+                f"p95 {percentile(latencies, 0.95):7.1f} ms, "
+                f"exact match {sum(normalize(p) == normalize(g) for p, g in zip(predictions, golds)) / len(golds):.1%}")
+        if gold_results is not None:
+            matches = sum(gold is not None and execute(args.db_dir, ex["db_id"], pred) == gold
+                          for ex, pred, gold in zip(examples, predictions, gold_results))
+            line += f", execution match {matches / len(examples):.1%}"
+        if reference is not None and backend != "torch":
+            line += f", same as fp32 {sum(a == b for a, b in zip(predictions, reference)) / len(reference):.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
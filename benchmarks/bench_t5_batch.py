@@ -0,0 +1,60 @@
+# benchmarks/bench_t5_batch.py
+#
+# Throughput of utils_text2sql.generate_sql_batch vs. calling generate_sql per question,
+# on questions from a Spider-format dev set.
+#   python benchmarks/bench_t5_batch.py --dev data/spider/dev.json --tables data/spider/tables.json --n 128
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.schema_parser import load_parsed_schema
+
+
+def tagged_schema(schema):
+    return "\n".join(
+        f"<tab>{table}</tab>(" + ", ".join(f"<col>{col}</col>" for col in cols) + ")"
+        for table, cols in schema["table_columns"].items()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dev", default="data/spider/dev.json")
+    parser.add_argument("--tables", default="data/spider/tables.json")
+    parser.add_argument("--n", type=int, default=128)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from utils_text2sql import generate_sql, generate_sql_batch
+
+    with open(args.dev) as f:
+        examples = json.load(f)
+    random.Random(args.seed).shuffle(examples)
+    examples = examples[:args.n]
+    schemas = load_parsed_schema(args.tables)
+    prompts = [tagged_schema(schemas[ex["db_id"]]) for ex in examples]
+    questions = [ex["question"] for ex in examples]
+
+    start = time.perf_counter()
+    baseline = [generate_sql(schema, question) for schema, question in zip(prompts, questions)]
+    elapsed = time.perf_counter() - start
+    print(f"{'per-question':>14}: {len(questions) / elapsed:7.2f} q/s ({elapsed:.1f}s)")
+
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        batched = generate_sql_batch(prompts, questions, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        agreement = sum(a == b for a, b in zip(batched, baseline)) / len(baseline)
+        print(f"{f'batch={batch_size}':>14}: {len(questions) / elapsed:7.2f} q/s ({elapsed:.1f}s), "
+              f"identical to per-question output: {agreement:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/stand_ins.py
+#
+# Offline stand-ins for the two model dependencies of the API, so end-to-end benchmarks
+# measure the pipeline around the models (matching, prompt building, queueing, SQLite)
+# without downloading or running them.
+
+import re
+import time
+import zlib
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+_TABLE = re.compile(r"<tab>(.*?)</tab>")
+_COLUMN = re.compile(r"<col>(.*?)</col>")
+
+
+class RandomProjectionEncoder:
+    """
+    SentenceTransformer stand-in: hashed word counts through a fixed Gaussian random
+    projection. Deterministic for a given seed, and texts sharing words stay close,
+    so schema matching behaves plausibly.
+    """
+
+    def __init__(self, dim: int = 384, n_features: int = 1 << 14, seed: int = 0):
+        self.dim = dim
+        self.n_features = n_features
+        self.projection = np.random.default_rng(seed).standard_normal((n_features, dim)).astype(np.float32)
+
+    def _embed(self, text: str) -> np.ndarray:
+        buckets = [zlib.crc32(token.encode("utf-8")) % self.n_features for token in _TOKEN.findall(text.lower())]
+        if not buckets:
+            return np.zeros(self.dim, dtype=np.float32)
+        return self.projection[buckets].sum(axis=0)
+
+    def encode(self, sentences, convert_to_numpy=True, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self._embed(sentences)
+        return np.stack([self._embed(text) for text in sentences]) if len(sentences) else \
+            np.zeros((0, self.dim), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+class FakeSQLGenerator:
+    """
+    SQLGenerator stand-in: answers with a SELECT over the first table and columns of the
+    schema prompt. `prefill_ms` and `token_ms` simulate model time so queueing and
+    streaming behave like the real generator.
+    """
+
+    def __init__(self, prefill_ms: float = 0.0, token_ms: float = 0.0):
+        self.prefill_ms = prefill_ms
+        self.token_ms = token_ms
+        self.last_timings = None
+
+    def _record(self, sql: str):
+        tokens = len(sql.split())
+        self.last_timings = {"prefix_s": 0.0, "prefill_s": self.prefill_ms / 1000,
+                             "decode_s": self.token_ms * tokens / 1000, "prompt_tokens": 0,
+                             "completion_tokens": tokens}
+
+    def _sql(self, schema: str) -> str:
+        table = _TABLE.search(schema)
+        columns = _COLUMN.findall(schema)[:3]
+        if not table:
+            return "SELECT 1"
+        return f"SELECT {', '.join(columns) or '*'} FROM {table.group(1)}"
+
+    def generate(self, question, schema, grammar=None):
+        sql = self._sql(schema)
+        time.sleep((self.prefill_ms + self.token_ms * len(sql.split())) / 1000)
+        self._record(sql)
+        return sql
+
+    def generate_stream(self, question, schema, cancel_event=None, grammar=None):
+        sql = self._sql(schema)
+        time.sleep(self.prefill_ms / 1000)
+        for i, word in enumerate(sql.split()):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            time.sleep(self.token_ms / 1000)
+            yield {"delta": word if i == 0 else " " + word}
+        self._record(sql)
+        yield {"sql": sql}
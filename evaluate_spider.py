@@ -0,0 +1,240 @@
+# evaluate_spider.py
+#
+# Offline execution-accuracy and throughput evaluation of the full pipeline
+# (match -> prompt -> generate -> execute) on a Spider-format dev set.
+#
+#   python evaluate_spider.py --dev data/spider/dev.json --tables data/spider/tables.json \
+#       --db-dir data/spider/database --workers 4 --generator llm --out eval.jsonl
+#
+# Examples are streamed through a process pool; each worker loads its own matcher,
+# generator and SQLite connections once. One JSON line per question is written as soon
+# as it finishes, with per-stage timings. The summary reports execution accuracy,
+# database-match accuracy, p50/p95/p99 latency per stage and questions/sec.
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from models.question_encoder import QuestionContext
+from utils.db_pool import SQLitePool, UnknownDatabase
+from utils.prompt_formatter import get_relevant_schema_prompt
+from utils.query_guard import QueryGuard, QueryTimeout
+from utils.schema_catalog import SchemaCatalog
+
+STAGES = ["match", "prompt", "generate", "execute", "total"]
+
+# Per-process state, set by init_worker.
+_worker = {}
+
+
+def iter_examples(path: str, chunk_size: int = 1 << 20):
+    """Yield examples from a JSON array (Spider's dev.json) or a JSONL file without loading it whole."""
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        buffer = buffer[1:]
+        eof = False
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                example, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield example
+            buffer = buffer[end:]
+
+
+def init_worker(tables_path: str, db_dir: str, generator_kind: str, time_budget_s: float, threads: int):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    from models.schema_matcher import SchemaMatcher, DEFAULT_MODEL_NAME
+    from models.subschema_index import SubSchemaIndex
+
+    catalog = SchemaCatalog.from_file(tables_path)
+    matcher = SchemaMatcher(tables_path, catalog=catalog)
+    _worker["catalog"] = catalog
+    _worker["matcher"] = matcher
+    _worker["subschemas"] = SubSchemaIndex(catalog, matcher.get_model(), DEFAULT_MODEL_NAME)
+    if generator_kind == "t5":
+        from utils_text2sql import generate_sql
+        _worker["generate"] = lambda question, schema: generate_sql(schema, question)
+    else:
+        from models.generator_llm import SQLGenerator
+        generator = SQLGenerator()
+        _worker["generate"] = lambda question, schema: generator.generate(question=question, schema=schema)
+    _worker["pool"] = SQLitePool(db_dir=db_dir, size=1)
+    _worker["guard"] = QueryGuard(time_budget_s=time_budget_s, plan_check="off")
+
+
+def run_query(db_id: str, sql: str):
+    with _worker["pool"].connection(db_id) as conn:
+        with _worker["guard"].time_budget(conn):
+            return [tuple(row) for row in conn.execute(sql).fetchall()]
+
+
+def same_result(gold_sql: str, gold_rows, pred_rows) -> bool:
+    """Spider-style comparison: row order matters only when the gold query orders its result."""
+    if "order by" in gold_sql.lower():
+        return gold_rows == pred_rows
+    return Counter(map(repr, gold_rows)) == Counter(map(repr, pred_rows))
+
+
+def evaluate_one(item):
+    index, example = item
+    question, gold_db, gold_sql = example["question"], example["db_id"], example["query"]
+    timings = {}
+    record = {"index": index, "db_id": gold_db, "question": question, "gold": gold_sql, "pred_db_id": None}
+    start = time.perf_counter()
+
+    try:
+        t = time.perf_counter()
+        matcher = _worker["matcher"]
+        ctx = QuestionContext(question, matcher.encoder)
+        db_id, _ = matcher.match(question, question_embedding=ctx.embedding)
+        timings["match"] = (time.perf_counter() - t) * 1000
+        record["pred_db_id"] = db_id
+
+        t = time.perf_counter()
+        catalog = _worker["catalog"]
+        schema_prompt = get_relevant_schema_prompt(question, catalog.parsed[db_id], matcher.get_model(),
+                                                   table_embeddings=_worker["subschemas"].table_embeddings(db_id),
+                                                   question_embedding=ctx.embedding,
+                                                   tagged_tables=catalog.tagged_tables(db_id))
+        timings["prompt"] = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        sql = _worker["generate"](question, schema_prompt).strip()
+        timings["generate"] = (time.perf_counter() - t) * 1000
+        record["sql"] = sql
+    except Exception as e:
+        # A failed decode (e.g. context overflow) is a miss for this question, not the run.
+        timings["total"] = (time.perf_counter() - start) * 1000
+        record["error"] = f"generation failed: {type(e).__name__}: {e}"
+        record["exec_match"] = False
+        record["timings_ms"] = {stage: round(ms, 3) for stage, ms in timings.items()}
+        return record
+
+    exec_match = False
+    t = time.perf_counter()
+    try:
+        # Predictions run against the gold database, so a wrong match is an execution miss.
+        pred_rows = run_query(gold_db, sql)
+    except (sqlite3.Error, QueryTimeout, UnknownDatabase) as e:
+        pred_rows = None
+        record["error"] = str(e)
+    timings["execute"] = (time.perf_counter() - t) * 1000
+    timings["total"] = (time.perf_counter() - start) * 1000
+
+    if pred_rows is not None:
+        try:
+            exec_match = same_result(gold_sql, run_query(gold_db, gold_sql), pred_rows)
+        except (sqlite3.Error, QueryTimeout) as e:
+            record["error"] = f"gold query failed: {e}"
+    record["exec_match"] = exec_match
+    record["timings_ms"] = {stage: round(ms, 3) for stage, ms in timings.items()}
+    return record
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def summarize(records, elapsed):
+    n = len(records)
+    print(f"\n{n} questions in {elapsed:.1f}s ({n / elapsed:.2f} questions/sec)")
+    if not n:
+        return
+    print(f"execution accuracy: {sum(r['exec_match'] for r in records) / n:.1%}")
+    print(f"database match:     {sum(r['pred_db_id'] == r['db_id'] for r in records) / n:.1%}")
+    print(f"errors:             {sum('error' in r for r in records)}")
+    print(f"{'stage':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for stage in STAGES:
+        # Questions that failed before a stage have no timing for it.
+        values = [r["timings_ms"][stage] for r in records if stage in r["timings_ms"]]
+        if not values:
+            continue
+        print(f"{stage:>10} {statistics.median(values):10.1f} {percentile(values, 0.95):10.1f} "
+              f"{percentile(values, 0.99):10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dev", default="data/spider/dev.json", help="Spider-format JSON array or JSONL")
+    parser.add_argument("--tables", default="data/spider/tables.json")
+    parser.add_argument("--db-dir", default="data/spider/database")
+    parser.add_argument("--generator", choices=["llm", "t5"], default="llm")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="torch threads per worker (0 = default)")
+    parser.add_argument("--time-budget", type=float, default=30.0, help="per-query SQLite time budget in seconds")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--out", default="eval.jsonl")
+    args = parser.parse_args()
+
+    # Build the schema catalog snapshot and the on-disk embedding indexes once so
+    # workers only load and map them.
+    from models.schema_matcher import SchemaMatcher, DEFAULT_MODEL_NAME
+    from models.subschema_index import SubSchemaIndex
+    catalog = SchemaCatalog.from_file(args.tables)
+    matcher = SchemaMatcher(args.tables, catalog=catalog)
+    SubSchemaIndex(catalog, matcher.get_model(), DEFAULT_MODEL_NAME)
+    del matcher, catalog
+
+    records = []
+    in_flight = set()
+    max_in_flight = 4 * args.workers
+    start = time.perf_counter()
+    with open(args.out, "w") as out, ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=get_context("spawn"), initializer=init_worker,
+            initargs=(args.tables, args.db_dir, args.generator, args.time_budget, args.threads_per_worker)) as pool:
+
+        def drain(block_until):
+            done, pending = wait(in_flight, return_when=block_until)
+            for future in done:
+                record = future.result()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                records.append(record)
+                if len(records) % 50 == 0:
+                    print(f"{len(records)} done, execution accuracy so far "
+                          f"{sum(r['exec_match'] for r in records) / len(records):.1%}")
+            return pending
+
+        for index, example in enumerate(iter_examples(args.dev)):
+            if args.limit and index >= args.limit:
+                break
+            in_flight.add(pool.submit(evaluate_one, (index, example)))
+            if len(in_flight) >= max_in_flight:
+                in_flight = drain(FIRST_COMPLETED)
+        while in_flight:
+            in_flight = drain(FIRST_COMPLETED)
+
+    summarize(records, time.perf_counter() - start)
+    print(f"✅ Saved per-question results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# export_text2sql_model.py
+#
+# Export the fine-tuned T5 checkpoint for faster loading and inference:
+#   python export_text2sql_model.py          # text2sql_model/safetensors (mmap-able weights)
+#   python export_text2sql_model.py --onnx   # also text2sql_model/onnx for T5_BACKEND=onnx
+
+import argparse
+
+from utils_text2sql import export_onnx, export_safetensors, onnx_dir, safetensors_dir
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=safetensors_dir)
+    parser.add_argument("--onnx", action="store_true", help="also export ONNX graphs (needs optimum[onnxruntime])")
+    parser.add_argument("--onnx-out", default=onnx_dir)
+    args = parser.parse_args()
+
+    print(f"✅ Saved safetensors to {export_safetensors(args.out)}")
+    if args.onnx:
+        print(f"✅ Saved ONNX model to {export_onnx(args.onnx_out, source_dir=args.out)}")
+
+
+if __name__ == "__main__":
+    main()
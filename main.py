@@ -1,23 +1,121 @@
 # main_api.py
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Depends, Header
 from pydantic import BaseModel
 from models.schema_matcher import SchemaMatcher
+from models.subschema_index import SubSchemaIndex
+from models.question_encoder import QuestionContext
 from models.generator_llm import SQLGenerator
+from models.inference_queue import InferenceQueue, QueueFullError
+from models.prefix_cache import PrefixKVCache
+from models.sql_cache import SQLCache
+from models.registry import ModelRegistry
+from models.schema_store import SchemaStore, SchemaFileWatcher
+from models.model_server import ModelClient, ModelServerError, RemoteSQLGenerator
 from utils.validation import is_question_relevant_to_schema
-from utils.fine_grained_schema import get_fine_grained_schema
-from utils.schema_parser import load_parsed_schema
-from utils.sql_postchecker import validate_sql_against_schema
+from utils.prompt_formatter import get_relevant_schema_prompt
+from utils.schema_catalog import SchemaCatalog
+from utils.sql_postchecker import SchemaValidatorCache
+from utils.metrics import Metrics, RequestMetricsMiddleware, CONTENT_TYPE, TOKEN_BUCKETS
+from utils.sql_grammar import SQLGrammarCache
+from utils.db_pool import SQLitePool, PoolTimeout, UnknownDatabase
+from utils.result_stream import CursorRegistry, CursorExpired, TooManyCursors, fetch_capped, iter_ndjson
+from utils.query_guard import QueryGuard, QueryRejected, QueryTimeout
+from utils.result_cache import QueryResultCache, data_version
 from fastapi.middleware.cors import CORSMiddleware
-from utils_text2sql import generate_sql
-from sentence_transformers import SentenceTransformer, util
-from typing import Dict, List
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Any, Dict, List, Optional
 import sqlparse
 import sqlite3
-import torch
+import os
+import json
+import asyncio
+import threading
+import itertools
+import contextvars
+from concurrent.futures import TimeoutError as FutureTimeout
+import secrets
+import logging
 
 app = FastAPI()
 DB_PATH = "/Users/vatsalvatsyayan/Class/NLP/database/allInOne/final.sqlite"
+TABLES_PATH = os.getenv("TABLES_PATH", "data/spider/tables.json")
+
+# Approximate schema retrieval for large catalogs (0 = exact search over all schemas).
+MATCHER_ANN_LISTS = int(os.getenv("MATCHER_ANN_LISTS", "0")) or None
+MATCHER_ANN_PROBE = int(os.getenv("MATCHER_ANN_PROBE", "8"))
+
+# Cross-request micro-batching of question embeddings (0 = encode each question on its own).
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "2"))
+
+# SQL generation runs off the event loop: one llama.cpp instance per concurrent job
+# (the GGUF weights are mmapped and shared), with at most SQL_GEN_MAX_QUEUE jobs waiting.
+SQL_GEN_CONCURRENCY = int(os.getenv("SQL_GEN_CONCURRENCY", "1"))
+SQL_GEN_MAX_QUEUE = int(os.getenv("SQL_GEN_MAX_QUEUE", "8"))
+
+# Memory budget for llama.cpp states of hot schema prompt prefixes (0 = no prefix cache).
+PREFIX_CACHE_MB = int(os.getenv("PREFIX_CACHE_MB", "1024"))
+
+# Constrain decoding to the matched database's identifiers with a llama.cpp grammar.
+SQL_GRAMMAR = os.getenv("SQL_GRAMMAR", "0") == "1"
+
+# Generated-SQL cache: exact (db_id, normalized question) hits, plus a semantic tier that
+# reuses SQL for questions within SQL_CACHE_SEMANTIC_THRESHOLD cosine (0 = exact only).
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "10000"))
+SQL_CACHE_TTL_S = float(os.getenv("SQL_CACHE_TTL_S", "0")) or None
+SQL_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("SQL_CACHE_SEMANTIC_THRESHOLD", "0")) or None
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH") or None
+
+# Pooled SQLite connections for /execute-query. Requests with a db_id use the Spider layout
+# <SQLITE_DB_DIR>/<db_id>/<db_id>.sqlite; requests without one use DB_PATH.
+SQLITE_DB_DIR = os.getenv("SQLITE_DB_DIR") or None
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+SQLITE_READ_ONLY = os.getenv("SQLITE_READ_ONLY", "1") == "1"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# Server-side caps on result sizes: rows per JSON/NDJSON response and rows per page.
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "10000"))
+MAX_PAGE_ROWS = int(os.getenv("MAX_PAGE_ROWS", "1000"))
+MAX_OPEN_CURSORS = int(os.getenv("MAX_OPEN_CURSORS", "64"))
+# An open page cursor holds a read transaction, which blocks WAL checkpoints until it expires.
+CURSOR_TTL_S = float(os.getenv("CURSOR_TTL_S", "60"))
+
+# Per-query wall-clock budget (0 = unlimited) and EXPLAIN QUERY PLAN admission of nested
+# full scans: QUERY_PLAN_CHECK is off, warn or reject above QUERY_MAX_PLAN_COST.
+QUERY_TIME_BUDGET_S = float(os.getenv("QUERY_TIME_BUDGET_S", "5"))
+QUERY_PLAN_CHECK = os.getenv("QUERY_PLAN_CHECK", "warn")
+QUERY_MAX_PLAN_COST = float(os.getenv("QUERY_MAX_PLAN_COST", "1e8"))
+
+# Memory budget for cached SELECT responses, invalidated when the database file changes (0 = off).
+RESULT_CACHE_MB = int(os.getenv("RESULT_CACHE_MB", "64"))
+
+# Models load on first use. WARMUP_MODELS ("all" or a comma-separated list of registry
+# names) loads them in the background at startup; /ready reports 503 until they are resident.
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "")
+
+# Per-stage timings go to /metrics; TRACE_SAMPLE_RATE of requests also log their spans
+# as JSON on the "text2sql.trace" logger.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Shared model process (python -m models.model_server) for multi-worker deployments: when
+# set, workers use its encoder and SQL generators over this Unix socket instead of loading
+# their own, with at most MODEL_SERVER_MAX_INFLIGHT generations per worker in flight.
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET") or None
+MODEL_SERVER_MAX_INFLIGHT = int(os.getenv("MODEL_SERVER_MAX_INFLIGHT", "8"))
+
+# Runtime schema changes: the /admin/schemas endpoints (guarded by ADMIN_TOKEN when set),
+# optionally written back to TABLES_PATH, and polling of TABLES_PATH every
+# SCHEMA_WATCH_INTERVAL_S seconds (0 = no file watch).
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+SCHEMA_PERSIST = os.getenv("SCHEMA_PERSIST", "0") == "1"
+SCHEMA_WATCH_INTERVAL_S = float(os.getenv("SCHEMA_WATCH_INTERVAL_S", "0"))
+
+logging.basicConfig(level=LOG_LEVEL)
 
 
 app.add_middleware(
@@ -28,12 +126,117 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-matcher = SchemaMatcher("data/spider/tables.json")
-generator = SQLGenerator()
-parsed_schemas = load_parsed_schema("data/spider/tables.json")
+db_pool = SQLitePool(db_dir=SQLITE_DB_DIR, default_path=DB_PATH, size=SQLITE_POOL_SIZE,
+                     read_only=SQLITE_READ_ONLY, journal_mode=SQLITE_JOURNAL_MODE,
+                     mmap_size=SQLITE_MMAP_MB * 1024 * 1024, cache_size_kib=SQLITE_CACHE_MB * 1024,
+                     cached_statements=SQLITE_STATEMENT_CACHE)
+query_guard = QueryGuard(time_budget_s=QUERY_TIME_BUDGET_S, plan_check=QUERY_PLAN_CHECK,
+                         max_plan_cost=QUERY_MAX_PLAN_COST)
+result_cache = QueryResultCache(RESULT_CACHE_MB * 1024 * 1024) if RESULT_CACHE_MB > 0 else None
+result_cursors = CursorRegistry(db_pool, max_page_rows=MAX_PAGE_ROWS, max_open=MAX_OPEN_CURSORS,
+                                ttl_seconds=CURSOR_TTL_S, guard=query_guard)
+model_client = ModelClient(MODEL_SERVER_SOCKET) if MODEL_SERVER_SOCKET else None
+# With a model server the KV states and compiled grammars live in that process.
+prefix_cache = None
+if model_client is None and PREFIX_CACHE_MB > 0:
+    prefix_cache = PrefixKVCache(PREFIX_CACHE_MB * 1024 * 1024)
+grammars = SQLGrammarCache(compiled=model_client is None)
+validators = SchemaValidatorCache()
+
+metrics = Metrics(trace_sample_rate=TRACE_SAMPLE_RATE)
+request_seconds = metrics.histogram("request_seconds", "Time until the response starts, per endpoint.", ["endpoint"])
+requests_total = metrics.counter("requests_total", "Requests per endpoint and status code.", ["endpoint", "status"])
+llm_tokens = metrics.histogram("llm_tokens", "Prompt and completion tokens per generation.", ["kind"],
+                               buckets=TOKEN_BUCKETS)
+postcheck_failures = metrics.counter("postcheck_failures_total",
+                                     "Generated SQL referencing tables or columns missing from the schema.")
+app.add_middleware(RequestMetricsMiddleware, metrics=metrics, request_seconds=request_seconds,
+                   requests_total=requests_total)
+
+# Everything that loads model weights or embeds the catalog is built on first use.
+registry = ModelRegistry()
+# Requests read one consistent schema snapshot; /admin/schemas and the file watch update it.
+schemas = SchemaStore(SchemaCatalog.from_file(TABLES_PATH), registry,
+                      persist_path=TABLES_PATH if SCHEMA_PERSIST else None)
+schema_watcher = None
+if SCHEMA_WATCH_INTERVAL_S > 0:
+    schema_watcher = SchemaFileWatcher(schemas, TABLES_PATH, SCHEMA_WATCH_INTERVAL_S)
+
+
+def build_schema_matcher():
+    if model_client is None:
+        return SchemaMatcher(TABLES_PATH, catalog=schemas.catalog, ann_lists=MATCHER_ANN_LISTS,
+                             ann_probe=MATCHER_ANN_PROBE, batch_max_size=EMBED_BATCH_MAX_SIZE,
+                             batch_max_wait_ms=EMBED_BATCH_MAX_WAIT_MS)
+    # The model server batches questions across all workers, so no batching here.
+    return SchemaMatcher(TABLES_PATH, catalog=schemas.catalog, ann_lists=MATCHER_ANN_LISTS,
+                         ann_probe=MATCHER_ANN_PROBE, model=model_client, model_name=model_client.model_name)
+
+
+def build_sql_generator():
+    if model_client is None:
+        return InferenceQueue([SQLGenerator(prefix_cache=prefix_cache) for _ in range(max(1, SQL_GEN_CONCURRENCY))],
+                              max_queue=SQL_GEN_MAX_QUEUE)
+    # Decoding is scheduled host-wide by the model server; this only bounds one worker's share.
+    return InferenceQueue([RemoteSQLGenerator(model_client) for _ in range(max(1, MODEL_SERVER_MAX_INFLIGHT))],
+                          max_queue=SQL_GEN_MAX_QUEUE)
+
+
+registry.register("schema_matcher", build_schema_matcher)
+registry.register("subschema_index", lambda: SubSchemaIndex(
+    schemas.catalog, registry.get("schema_matcher").get_model(), registry.get("schema_matcher").model_name,
+    index_dir=registry.get("schema_matcher").index_dir))
+registry.register("sql_generator", build_sql_generator)
+if SQL_CACHE_SIZE > 0:
+    registry.register("sql_cache", lambda: SQLCache(
+        max_entries=SQL_CACHE_SIZE, ttl_seconds=SQL_CACHE_TTL_S,
+        semantic_threshold=SQL_CACHE_SEMANTIC_THRESHOLD, path=SQL_CACHE_PATH,
+        schema_hashes=dict(schemas.catalog.fingerprints)))
+
+
+def on_schema_change(db_ids: List[str], catalog: SchemaCatalog):
+    # Grammars and validators rebuild on their own when handed a replaced schema.
+    for db_id in db_ids:
+        if db_id not in catalog:
+            grammars.invalidate(db_id)
+            validators.invalidate(db_id)
+        if result_cache:
+            result_cache.invalidate(db_id)
+    sql_cache = registry.peek("sql_cache")
+    if sql_cache:
+        sql_cache.sync_schemas(catalog.fingerprints)
+
+
+schemas.add_listener(on_schema_change)
+
+
+@app.on_event("startup")
+def start_warmup():
+    names = warmup_names(WARMUP_MODELS)
+    if names:
+        threading.Thread(target=registry.warmup, args=(names,), name="model-warmup", daemon=True).start()
+    if schema_watcher:
+        schema_watcher.start()
+
+
+@app.on_event("shutdown")
+def stop_schema_watcher():
+    if schema_watcher:
+        schema_watcher.close()
+
+
+def warmup_names(spec: str) -> List[str]:
+    if spec.strip() == "all":
+        return registry.names()
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in registry.names()]
+    if unknown:
+        raise ValueError(f"Unknown models in WARMUP_MODELS: {', '.join(unknown)}")
+    return names
 
 class QuestionInput(BaseModel):
     question: str
+    top_k: int = 1
 
 class ConfirmInput(BaseModel):
     question: str
@@ -44,6 +247,24 @@ class QuestionOnlyRequest(BaseModel):
 
 class QueryRequest(BaseModel):
     query: str
+    db_id: Optional[str] = None
+    # SELECT results only: stream=True returns NDJSON; page_size returns the first page
+    # plus a next_cursor for /execute-query/page.
+    stream: bool = False
+    page_size: Optional[int] = None
+
+class PageRequest(BaseModel):
+    cursor: str
+    page_size: Optional[int] = None
+
+class WarmupRequest(BaseModel):
+    # Registry names to load; empty loads every registered model.
+    models: List[str] = []
+
+class SchemaUpdate(BaseModel):
+    # Spider tables.json entries to add or replace, and db_ids to remove.
+    schemas: List[Dict[str, Any]] = []
+    remove: List[str] = []
 
 
 def is_valid_sql(sql: str) -> bool:
@@ -56,88 +277,413 @@ def is_valid_sql(sql: str) -> bool:
 @app.post("/match_schema/")
 def match_schema(input: QuestionInput):
     question = input.question
-    db_id, _ = matcher.match(question)
-    schema_obj = parsed_schemas.get(db_id)
-    schema_text = get_fine_grained_schema(matcher.schema_by_id[db_id])
-
-    if not is_question_relevant_to_schema(question, schema_text, matcher.get_model()):
+    snapshot = schemas.snapshot()
+    matcher = registry.get("schema_matcher")
+    subschemas = registry.get("subschema_index")
+    with metrics.stage("schema_match"):
+        ctx = QuestionContext(question, matcher.encoder)
+        candidates = matcher.match_top_k(question, k=max(1, input.top_k), question_embedding=ctx.embedding,
+                                         state=snapshot.matcher)
+    db_id, _ = candidates[0]
+    schema_text = snapshot.catalog.fine_grained_texts[db_id]
+    extra = {}
+    if input.top_k > 1:
+        extra["candidates"] = [{"db_id": cand_id, "score": score} for cand_id, score in candidates]
+
+    with metrics.stage("relevance_gate"):
+        relevant = is_question_relevant_to_schema(question, schema_text, matcher.get_model(),
+                                                  schema_embeddings=subschemas.line_embeddings(
+                                                      db_id, state=snapshot.subschemas),
+                                                  question_embedding=ctx.embedding)
+    if not relevant:
         return {
             "db_id": db_id,
             "schema": schema_text,
             "relevant": False,
-            "message": "Question is not relevant to the matched database schema."
+            "message": "Question is not relevant to the matched database schema.",
+            **extra
         }
 
     return {
         "db_id": db_id,
         "schema": schema_text,
-        "relevant": True
+        "relevant": True,
+        **extra
     }
 
-@app.post("/generate-sql/")
-async def generate_sql_from_question(request: QuestionOnlyRequest):
-    question = request.question
+async def match_question(question: str):
+    """
+    Embed the question once and match it to a database; returns (ctx, db_id, snapshot).
+    Later stages use the same schema snapshot as the match.
+    """
+    snapshot = await schemas.asnapshot()
+    matcher = await registry.aget("schema_matcher")
+    with metrics.stage("schema_match"):
+        ctx = QuestionContext(question, matcher.encoder)
+        await ctx.embedding_async()
+
+        db_id, _ = matcher.match(question, question_embedding=ctx.embedding, state=snapshot.matcher)
+    metrics.annotate(db_id=db_id)
+    return ctx, db_id, snapshot
+
+
+async def build_schema_prompt(ctx: QuestionContext, db_id: str, snapshot) -> str:
+    schema_obj = snapshot.catalog.parsed[db_id]
+    subschemas = await registry.aget("subschema_index")
+
+    with metrics.stage("prompt_build"):
+        schema_prompt = get_relevant_schema_prompt(ctx.question, schema_obj,
+                                                   registry.get("schema_matcher").get_model(),
+                                                   table_embeddings=subschemas.table_embeddings(
+                                                       db_id, state=snapshot.subschemas),
+                                                   question_embedding=ctx.embedding,
+                                                   tagged_tables=snapshot.catalog.tagged_tables(db_id))
+
+    logging.debug(f"schema prompt: {schema_prompt}")
+    return schema_prompt
+
+
+def observe_generation(timings: Optional[dict]):
+    """Record a generator's `last_timings`: prefix restore, prefill, decode and token counts."""
+    if not timings:
+        return
+    metrics.observe_stage("llm_prefix", timings["prefix_s"])
+    metrics.observe_stage("llm_prefill", timings["prefill_s"])
+    metrics.observe_stage("llm_decode", timings["decode_s"])
+    llm_tokens.observe(timings["prompt_tokens"], kind="prompt")
+    llm_tokens.observe(timings["completion_tokens"], kind="completion")
+    metrics.annotate(prompt_tokens=timings["prompt_tokens"], completion_tokens=timings["completion_tokens"])
+
+
+def post_check(db_id: str, sql: str, catalog: SchemaCatalog) -> bool:
+    """Whether `sql` only uses tables and columns of `db_id`."""
+    with metrics.stage("post_check"):
+        problems = validators.get(db_id, catalog.parsed[db_id]).problems(sql)
+    if problems["tables"] or problems["columns"]:
+        postcheck_failures.inc()
+        logging.warning(f"Generated SQL for {db_id} uses unknown identifiers: {problems}")
+        return False
+    return True
+
+
+async def cached_sql(ctx: QuestionContext, db_id: str):
+    if "sql_cache" not in registry.names():
+        return None
+    sql_cache = await registry.aget("sql_cache")
+    return sql_cache.get(db_id, ctx.question, ctx.embedding)
+
+
+def remember_sql(ctx: QuestionContext, db_id: str, sql: str, catalog: SchemaCatalog):
+    sql_cache = registry.peek("sql_cache")
+    if sql_cache:
+        sql_cache.put(db_id, ctx.question, sql, ctx.embedding, schema_hash=catalog.fingerprints[db_id])
 
-    db_id, _ = matcher.match(question)
-    schema_obj = parsed_schemas[db_id]
 
-    schema_prompt = get_relevant_schema_prompt(request.question, schema_obj, matcher.get_model())
+def grammar_for(db_id: str, catalog: SchemaCatalog):
+    return grammars.get(db_id, catalog.parsed[db_id]) if SQL_GRAMMAR else None
 
-    print(f"schema prompt: {schema_prompt}")
 
-    sql = generator.generate(question=question, schema=schema_prompt)
+def generation_at_capacity():
+    return HTTPException(status_code=503, detail="SQL generation is at capacity, retry shortly.",
+                         headers={"Retry-After": "1"})
 
+
+@app.post("/generate-sql/")
+async def generate_sql_from_question(request: QuestionOnlyRequest):
+    question = request.question
+    ctx, db_id, snapshot = await match_question(question)
+    catalog = snapshot.catalog
+
+    sql = await cached_sql(ctx, db_id)
+    cached = sql is not None
+    if not cached:
+        schema_prompt = await build_schema_prompt(ctx, db_id, snapshot)
+        grammar = grammar_for(db_id, catalog)
+        inference_queue = await registry.aget("sql_generator")
+
+        def run(gen):
+            return gen.generate(question=question, schema=schema_prompt, grammar=grammar), \
+                getattr(gen, "last_timings", None)
+
+        try:
+            sql, timings = await inference_queue.run(run)
+        except QueueFullError:
+            raise generation_at_capacity()
+        observe_generation(timings)
+
+    sql = sql.strip()
+    schema_valid = post_check(db_id, sql, catalog)
+    # Only SQL that passed the post-check is reused for later questions.
+    if schema_valid and not cached:
+        remember_sql(ctx, db_id, sql, catalog)
     return {
         "question": request.question,
-        "sql": sql.strip()
+        "sql": sql,
+        "schema_valid": schema_valid
     }
 
 
-@app.post("/execute-query")
-def execute_query(request: QueryRequest):
+@app.post("/generate-sql/stream")
+async def generate_sql_stream(request: QuestionOnlyRequest, http_request: Request):
+    """
+    Server-Sent Events variant of /generate-sql/: `data: {"delta": ...}` events while
+    decoding, then `event: done` with the cleaned SQL. Disconnecting cancels decoding.
+    """
+    question = request.question
+    ctx, db_id, snapshot = await match_question(question)
+    catalog = snapshot.catalog
+
+    sql = await cached_sql(ctx, db_id)
+    if sql is not None:
+        payload = {"question": question, "db_id": db_id, "sql": sql, "schema_valid": post_check(db_id, sql, catalog)}
+        return StreamingResponse(iter([f"event: done\ndata: {json.dumps(payload)}\n\n"]),
+                                 media_type="text/event-stream")
+
+    schema_prompt = await build_schema_prompt(ctx, db_id, snapshot)
+    grammar = grammar_for(db_id, catalog)
+    inference_queue = await registry.aget("sql_generator")
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancel = threading.Event()
+    queue_full = object()
+
+    def produce(gen):
+        try:
+            for event in gen.generate_stream(question=question, schema=schema_prompt,
+                                             cancel_event=cancel, grammar=grammar):
+                loop.call_soon_threadsafe(events.put_nowait, event)
+            if not cancel.is_set():
+                observe_generation(getattr(gen, "last_timings", None))
+        except QueueFullError:
+            # A model server reports its host-wide queue as full only once the job reaches it.
+            loop.call_soon_threadsafe(events.put_nowait, queue_full)
+        except Exception as e:
+            loop.call_soon_threadsafe(events.put_nowait, {"error": str(e)})
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    # Decoding runs on an inference thread; carry the request's sampled trace there.
+    context = contextvars.copy_context()
+    try:
+        inference_queue.submit(lambda gen: context.run(produce, gen))
+    except QueueFullError:
+        raise generation_at_capacity()
+
+    async def next_event():
+        """The next generator event, or None once it is done or the client has gone away."""
+        while True:
+            try:
+                return await asyncio.wait_for(events.get(), timeout=0.5)
+            except asyncio.TimeoutError:
+                if await http_request.is_disconnected():
+                    return None
+
+    # The first event decides the status code, so a full queue is a 503 as in /generate-sql/.
+    try:
+        first = await next_event()
+    except BaseException:
+        cancel.set()
+        raise
+    if first is queue_full:
+        raise generation_at_capacity()
+    if first is None:
+        cancel.set()
+
+    async def sse(event):
+        try:
+            while event is not None:
+                if "sql" in event:
+                    sql = event["sql"].strip()
+                    schema_valid = post_check(db_id, sql, catalog)
+                    if schema_valid:
+                        remember_sql(ctx, db_id, sql, catalog)
+                    payload = {"question": question, "db_id": db_id, "sql": sql, "schema_valid": schema_valid}
+                    yield f"event: done\ndata: {json.dumps(payload)}\n\n"
+                elif "error" in event:
+                    yield f"event: error\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield f"data: {json.dumps(event)}\n\n"
+                event = await next_event()
+        finally:
+            # Runs on normal completion and when the client goes away mid-stream.
+            cancel.set()
+
+    return StreamingResponse(sse(first), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once every WARMUP_MODELS entry is resident, else 503."""
+    required = warmup_names(WARMUP_MODELS)
+    is_ready = all(registry.is_loaded(name) for name in required)
+    return JSONResponse(status_code=200 if is_ready else 503,
+                        content={"ready": is_ready, "required": required, "models": registry.status()})
+
+
+@app.post("/warmup")
+async def warmup(request: WarmupRequest):
+    unknown = [name for name in request.models if name not in registry.names()]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown models: {', '.join(unknown)}")
+    await asyncio.to_thread(registry.warmup, request.models or None)
+    return {"models": registry.status()}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN and not (x_admin_token and secrets.compare_digest(x_admin_token, ADMIN_TOKEN)):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token.")
+
+
+def apply_schema_update(upserts: List[Dict[str, Any]], removals: List[str]):
+    missing_id = [i for i, db in enumerate(upserts) if not isinstance(db.get("db_id"), str)]
+    if missing_id:
+        raise HTTPException(status_code=422, detail=f"Schemas without a db_id at positions {missing_id}")
+    unknown = [db_id for db_id in removals if db_id not in schemas.catalog]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown databases: {', '.join(unknown)}")
+    try:
+        changes = schemas.apply(upserts, removals)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid schema update: {str(e)}")
+    seconds = schemas.last_update_seconds if any(changes.values()) else 0.0
+    return {**changes, "databases": len(schemas.catalog), "seconds": seconds}
+
 
+@app.get("/admin/schemas", dependencies=[Depends(require_admin)])
+def list_schemas():
+    """db_id -> schema fingerprint of every registered database."""
+    return {"databases": dict(schemas.catalog.fingerprints)}
 
-    print(request)
+
+@app.post("/admin/schemas", dependencies=[Depends(require_admin)])
+def update_schemas(update: SchemaUpdate):
+    """
+    Add or replace `schemas` and remove the `remove` db_ids in one step. Only those
+    databases are re-embedded; requests already running keep the previous schemas.
+    """
+    return apply_schema_update(update.schemas, update.remove)
+
+
+@app.put("/admin/schemas/{db_id}", dependencies=[Depends(require_admin)])
+def put_schema(db_id: str, schema: Dict[str, Any]):
+    if schema.setdefault("db_id", db_id) != db_id:
+        raise HTTPException(status_code=422, detail=f"Body db_id {schema['db_id']!r} does not match {db_id!r}")
+    return apply_schema_update([schema], [])
+
+
+@app.delete("/admin/schemas/{db_id}", dependencies=[Depends(require_admin)])
+def delete_schema(db_id: str):
+    return apply_schema_update([], [db_id])
+
+
+@app.get("/stats")
+def stats():
+    # Only resident models report; reading stats never triggers a load.
+    matcher = registry.peek("schema_matcher")
+    inference_queue = registry.peek("sql_generator")
+    sql_cache = registry.peek("sql_cache")
+    return {
+        "models": registry.status(),
+        "question_cache": matcher.encoder.stats() if matcher else None,
+        "embedding_batcher": matcher.batcher.stats() if matcher and matcher.batcher else None,
+        "inference_queue": inference_queue.stats() if inference_queue else None,
+        "prefix_cache": prefix_cache.stats() if prefix_cache else None,
+        "sql_cache": sql_cache.stats() if sql_cache else None,
+        "sqlite_pool": db_pool.stats(),
+        "result_cursors": result_cursors.stats(),
+        "query_guard": query_guard.stats(),
+        "result_cache": result_cache.stats() if result_cache else None,
+        "schemas": schemas.stats(),
+        "model_server": model_server_stats() if model_client else None,
+    }
+
+
+def model_server_stats() -> dict:
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute(request.query)
-        
-        if request.query.strip().lower().startswith("select"):
-            rows = cursor.fetchall()
-            results = [dict(row) for row in rows]
-            return {"results": results}
-        else:
-            conn.commit()
-            return {"message": "Query executed successfully."}
-    except sqlite3.Error as e:
-        print("Error Message:", str(e))
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+        return model_client.stats()
+    except (OSError, FutureTimeout, ModelServerError) as e:
+        return {"error": str(e)}
 
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+metrics.add_collector(stats)
 
-def get_relevant_schema_prompt(question: str, schema_obj: dict, model: SentenceTransformer) -> str:
-    
-    table_names = schema_obj["tables"]
-    table_columns = schema_obj["table_columns"]
 
-    table_texts = [
-        f"{table}: {', '.join(cols)}" for table, cols in table_columns.items()
-    ]
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text format: per-stage and per-endpoint histograms plus /stats as gauges."""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
 
-    question_embedding = model.encode(question, convert_to_tensor=True)
-    table_embeddings = model.encode(table_texts, convert_to_tensor=True)
-    scores = util.cos_sim(question_embedding, table_embeddings)[0]
 
-    top_idx = scores.argmax().item()
-    top_table = table_names[top_idx]
-    top_cols = table_columns[top_table]
-    col_str = ", ".join([f"<col>{col}</col>" for col in top_cols])
+@app.post("/execute-query")
+def execute_query(request: QueryRequest):
+    logging.debug(f"execute-query: {request}")
+    is_select = request.query.strip().lower().startswith("select")
+    try:
+        if is_select and request.stream:
+            stream = iter_ndjson(db_pool, request.db_id, request.query, MAX_RESULT_ROWS, guard=query_guard)
+            # Run the query before answering so SQL errors still map to a 400.
+            with metrics.stage("sqlite_execute"):
+                header = next(stream)
+            return StreamingResponse(itertools.chain([header], stream), media_type="application/x-ndjson")
+        if is_select and request.page_size is not None:
+            with metrics.stage("sqlite_execute"):
+                return result_cursors.open(request.db_id, request.query, request.page_size)
+
+        version = None
+        if is_select and result_cache:
+            version = data_version(db_pool.database_path(request.db_id))
+            cached = result_cache.get(request.db_id, request.query, version)
+            if cached is not None:
+                return cached
+
+        with db_pool.connection(request.db_id) as conn:
+            warnings = query_guard.admit(conn, request.query)
+            cursor = conn.cursor()
+            try:
+                with metrics.stage("sqlite_execute"), query_guard.time_budget(conn):
+                    cursor.execute(request.query)
+
+                    if is_select:
+                        rows, truncated = fetch_capped(cursor, MAX_RESULT_ROWS)
+                        response = {"results": [dict(row) for row in rows]}
+                    else:
+                        conn.commit()
+                        response = {"message": "Query executed successfully."}
+                if is_select and truncated:
+                    response["truncated"] = True
+                if warnings:
+                    response["warnings"] = warnings
+                if version is not None:
+                    result_cache.put(request.db_id, request.query, version, response)
+                elif result_cache and not is_select:
+                    result_cache.invalidate(request.db_id)
+                return response
+            finally:
+                cursor.close()
+    except QueryRejected as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "estimated_cost": e.plan["cost"],
+                                                     "plan": e.plan["steps"]})
+    except QueryTimeout as e:
+        raise HTTPException(status_code=408, detail=str(e))
+    except UnknownDatabase as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except (PoolTimeout, TooManyCursors) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except sqlite3.Error as e:
+        logging.warning(f"Query failed: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 
-    return f"<tab>{top_table}</tab>({col_str})"
+@app.post("/execute-query/page")
+def execute_query_page(request: PageRequest):
+    try:
+        with metrics.stage("sqlite_execute"):
+            return result_cursors.next_page(request.cursor, request.page_size)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=408, detail=str(e))
+    except CursorExpired as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
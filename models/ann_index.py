@@ -0,0 +1,103 @@
+# models/ann_index.py
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k largest scores, best first (argpartition, not a full sort)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    if k < len(scores):
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(len(scores))
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return idx, scores[idx]
+
+
+class IVFIndex:
+    """
+    Approximate inner-product search over L2-normalized embeddings.
+
+    Rows are partitioned with spherical k-means into `n_lists` clusters. A query is
+    scored against the centroids and only the rows of the `n_probe` closest clusters
+    are scored exactly. Raising `n_probe` trades latency for recall; probing every
+    list is equivalent to exact search.
+    """
+
+    def __init__(self, embeddings: np.ndarray, n_lists: Optional[int] = None, n_probe: int = 8,
+                 n_iter: int = 10, sample_size: int = 65536, seed: int = 0):
+        self.embeddings = embeddings
+        n_rows = len(embeddings)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(n_rows)))
+        self.n_lists = max(1, min(n_lists, n_rows))
+        self.n_probe = n_probe
+
+        rng = np.random.default_rng(seed)
+        sample = embeddings
+        if n_rows > sample_size:
+            sample = embeddings[np.sort(rng.choice(n_rows, sample_size, replace=False))]
+        self.centroids = self._train(np.asarray(sample, dtype=np.float32), n_iter, rng)
+
+        self._set_lists(self._assign(embeddings))
+
+    def _set_lists(self, assignments: np.ndarray):
+        self._assignments = assignments
+        self._order = np.argsort(assignments, kind="stable")
+        self._offsets = np.searchsorted(assignments[self._order], np.arange(self.n_lists + 1))
+
+    def updated(self, embeddings: np.ndarray, previous_rows: np.ndarray) -> "IVFIndex":
+        """
+        An index over `embeddings` that keeps these centroids. `previous_rows[i]` is the
+        row of `embeddings[i]` in this index, or -1 for a new row; kept rows keep their
+        list and only new rows are assigned. This index is left unchanged.
+        """
+        index = IVFIndex.__new__(IVFIndex)
+        index.embeddings = embeddings
+        index.n_lists = self.n_lists
+        index.n_probe = self.n_probe
+        index.centroids = self.centroids
+        assignments = np.empty(len(embeddings), dtype=np.int64)
+        kept = previous_rows >= 0
+        assignments[kept] = self._assignments[previous_rows[kept]]
+        if not kept.all():
+            assignments[~kept] = self._assign(embeddings[~kept])
+        index._set_lists(assignments)
+        return index
+
+    def _train(self, sample: np.ndarray, n_iter: int, rng) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=self.n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters from random rows instead of dropping them.
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        return centroids
+
+    def _assign(self, rows: np.ndarray, centroids: Optional[np.ndarray] = None, chunk: int = 16384) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        assignments = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), chunk):
+            block = np.asarray(rows[start:start + chunk], dtype=np.float32)
+            assignments[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def search(self, query: np.ndarray, k: int, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        lists, _ = top_k(self.centroids @ query, n_probe)
+        candidates = np.concatenate([self._order[self._offsets[l]:self._offsets[l + 1]] for l in lists])
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        idx, scores = top_k(self.embeddings[candidates] @ query, k)
+        return candidates[idx], scores
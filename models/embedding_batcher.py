@@ -0,0 +1,112 @@
+# models/embedding_batcher.py
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent `encode` calls into one forward pass.
+
+    Callers from any thread submit single texts; a worker thread waits up to
+    `max_wait_ms` after the first pending text (or until `max_batch` texts are
+    queued), runs one batched `model.encode` and scatters the rows back through
+    futures. Duplicate texts inside a batch are encoded once.
+    """
+
+    def __init__(self, model, max_batch: int = 32, max_wait_ms: float = 2.0, window: int = 1024):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        if self._closed:
+            raise RuntimeError("EmbeddingBatcher is closed")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.submit(text).result()
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self) -> List:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            start = time.perf_counter()
+            try:
+                embeddings = self.model.encode(texts, convert_to_numpy=True, batch_size=len(texts))
+            except Exception as e:
+                logging.error(f"Batched encode failed: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            rows = {text: embeddings[i] for i, text in enumerate(texts)}
+            for text, future in batch:
+                future.set_result(rows[text])
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self._recent.append((len(batch), latency_ms))
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = list(self._recent)
+            batches, items = self.batches, self.items
+        sizes = [size for size, _ in recent]
+        latencies = [latency for _, latency in recent]
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "items": items,
+            "pending": self._queue.qsize(),
+            "mean_batch_size": float(np.mean(sizes)) if sizes else 0.0,
+            "max_batch_size": max(sizes) if sizes else 0,
+            "mean_latency_ms": float(np.mean(latencies)) if latencies else 0.0,
+            "p95_latency_ms": float(np.percentile(latencies, 95)) if latencies else 0.0,
+        }
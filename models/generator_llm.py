@@ -28,12 +28,21 @@
 
 import os
 import re
+import time
 import logging
-from llama_cpp import Llama
+
+# Decoding stops at the end of the statement or at the first blank line.
+STOP_SEQUENCES = ["\n\n", ";"]
+
+# Everything before this marker depends only on the schema and is shared across questions.
+QUESTION_MARKER = "### Question:"
 
 class SQLGenerator:
-    def __init__(self):
-        """Initialize with local GGUF model"""
+    def __init__(self, prefix_cache=None):
+        """
+        Initialize with local GGUF model. `prefix_cache` (a PrefixKVCache) lets repeated
+        prompts for the same schema skip prefilling the schema block.
+        """
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.model_path = os.path.join(current_dir, "sqlcoder-7b.Q4_K_M.gguf")
 
@@ -49,6 +58,8 @@ class SQLGenerator:
 
         # Llama.__del__ = safe_del
 
+        from llama_cpp import Llama
+
         self.model = Llama(
             model_path=self.model_path,
             n_ctx=2048,
@@ -57,13 +68,16 @@ class SQLGenerator:
             verbose=False
         )
 
+        self.prefix_cache = prefix_cache
+        self._resident_prefix = None
+        self.last_timings = None
+
         logging.info(f"✅ Loaded model from: {self.model_path}")
 
     
 
-    def generate(self, question: str, schema: str) -> str:
-        try:
-            prompt = f"""### Postgres SQL tables, with their properties:
+    def _build_prompt(self, question: str, schema: str) -> str:
+        return f"""### Postgres SQL tables, with their properties:
 {schema}
 
 ### Question:
@@ -72,14 +86,78 @@ class SQLGenerator:
 ### SQL query (no aliases, no extra formatting, lowercase only):
 select """
 
-            output = self.model(
-                prompt=prompt,
-                max_tokens=300,
-                temperature=0.1,
-                stop=["\n\n", ";"]
-            )
-
-            raw_output = output["choices"][0]["text"]
+    def _prime_prefix(self, prompt: str):
+        """
+        Make the schema prefix of `prompt` resident in the model's KV cache, restoring it
+        from the prefix cache or evaluating and storing it. llama.cpp then reuses the
+        longest matching token prefix and only prefills the question suffix.
+        """
+        if self.prefix_cache is None:
+            return
+        prefix = prompt[:prompt.index(QUESTION_MARKER)]
+        if prefix == self._resident_prefix:
+            self.prefix_cache.record_hit()
+            return
+
+        state = self.prefix_cache.get(prefix)
+        if state is not None:
+            self.model.load_state(state)
+        else:
+            self.model.reset()
+            self.model.eval(self.model.tokenize(prefix.encode("utf-8")))
+            self.prefix_cache.put(prefix, self.model.save_state())
+        self._resident_prefix = prefix
+
+    def _complete(self, prompt: str, grammar=None, cancel_event=None):
+        """
+        Decode `prompt`, yielding text chunks. Afterwards `last_timings` holds the time
+        spent restoring/evaluating the schema prefix, prefill (until the first token),
+        decode (the remaining tokens) and the prompt and completion token counts.
+        """
+        timings = {"prefix_s": 0.0, "prefill_s": 0.0, "decode_s": 0.0,
+                   "prompt_tokens": len(self.model.tokenize(prompt.encode("utf-8"))), "completion_tokens": 0}
+        self.last_timings = timings
+
+        start = time.perf_counter()
+        self._prime_prefix(prompt)
+        timings["prefix_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stream = self.model(
+            prompt=prompt,
+            max_tokens=300,
+            temperature=0.1,
+            stop=STOP_SEQUENCES,
+            grammar=grammar,
+            stream=True
+        )
+        first_token = None
+        try:
+            for chunk in stream:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    timings["prefill_s"] = first_token - start
+                timings["completion_tokens"] += 1
+                if cancel_event is not None and cancel_event.is_set():
+                    logging.info("Streaming generation cancelled by client")
+                    return
+                text = chunk["choices"][0]["text"]
+                if text:
+                    yield text
+        finally:
+            stream.close()
+            if first_token is None:
+                timings["prefill_s"] = time.perf_counter() - start
+            else:
+                timings["decode_s"] = time.perf_counter() - first_token
+
+    def generate(self, question: str, schema: str, grammar=None) -> str:
+        """
+        `grammar` is an optional LlamaGrammar (see utils/sql_grammar.py) restricting
+        decoding to SQL over the matched database's tables and columns.
+        """
+        try:
+            raw_output = "".join(self._complete(self._build_prompt(question, schema), grammar=grammar))
             logging.debug(f"📤 Raw output: {raw_output}")
             return self._clean_output(raw_output)
 
@@ -87,6 +165,31 @@ select """
             logging.error(f"Generation failed: {str(e)}")
             raise
 
+    def generate_stream(self, question: str, schema: str, cancel_event=None, grammar=None):
+        """
+        Stream the completion as it is decoded. Yields {"delta": text} for each chunk
+        and finally {"sql": cleaned_sql}. Setting `cancel_event` (a threading.Event)
+        stops decoding after the current token and frees the model; nothing else is yielded.
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        prompt = self._build_prompt(question, schema)
+
+        parts = []
+        try:
+            for text in self._complete(prompt, grammar=grammar, cancel_event=cancel_event):
+                parts.append(text)
+                yield {"delta": text}
+        except Exception as e:
+            logging.error(f"Streaming generation failed: {str(e)}")
+            raise
+        if cancel_event is not None and cancel_event.is_set():
+            return
+
+        raw_output = "".join(parts)
+        logging.debug(f"📤 Raw output: {raw_output}")
+        yield {"sql": self._clean_output(raw_output)}
+
     def _clean_output(self, raw_text: str) -> str:
         try:
             sql = "select " + raw_text.lower().split("select", 1)[-1].split(";")[0].strip()
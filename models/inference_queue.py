@@ -0,0 +1,100 @@
+# models/inference_queue.py
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+
+
+class QueueFullError(Exception):
+    """Raised by InferenceQueue.submit when `max_queue` jobs are already waiting."""
+
+
+class InferenceQueue:
+    """
+    Bounded executor for blocking model calls such as SQLGenerator.generate.
+
+    `workers` are the model instances; each one is served by a dedicated thread, so
+    concurrency equals `len(workers)` and no instance is ever used by two jobs at once.
+    At most `max_queue` jobs may wait for a free worker; beyond that `submit` fails
+    fast with QueueFullError instead of letting latency grow without bound.
+    """
+
+    def __init__(self, workers: List, max_queue: int = 8, window: int = 1024):
+        if not workers:
+            raise ValueError("InferenceQueue needs at least one worker")
+        self.concurrency = len(workers)
+        self.max_queue = max_queue
+        self._slots = queue.Queue()
+        for worker in workers:
+            self._slots.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._recent = deque(maxlen=window)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule `fn(worker, *args, **kwargs)` on the next free worker."""
+        with self._lock:
+            # Admit on total occupancy: a job that finds a worker idle never waits, even with max_queue=0.
+            if self._running + self._waiting >= self.concurrency + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"{self._running} inference jobs running and {self._waiting} queued")
+            self._waiting += 1
+        enqueued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+            worker = self._slots.get()
+            ok = False
+            try:
+                result = fn(worker, *args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self._slots.put(worker)
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                    self._recent.append(((started - enqueued) * 1000, (finished - started) * 1000))
+
+        return self._executor.submit(job)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Await `fn(worker, ...)` from the event loop without blocking it."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = list(self._recent)
+            snapshot = {
+                "concurrency": self.concurrency,
+                "max_queue": self.max_queue,
+                "queue_depth": self._waiting,
+                "running": self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+        waits = [wait for wait, _ in recent]
+        services = [service for _, service in recent]
+        for name, values in (("wait", waits), ("service", services)):
+            snapshot[f"mean_{name}_ms"] = float(np.mean(values)) if values else 0.0
+            snapshot[f"p95_{name}_ms"] = float(np.percentile(values, 95)) if values else 0.0
+        return snapshot
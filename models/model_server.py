@@ -0,0 +1,446 @@
+# models/model_server.py
+#
+# Optional shared model process for multi-worker deployments. One process owns the
+# sentence encoder and the llama.cpp SQL generators; every API worker talks to it over
+# a Unix socket instead of loading its own copies:
+#
+#   python -m models.model_server --socket /tmp/text2sql-models.sock
+#   MODEL_SERVER_SOCKET=/tmp/text2sql-models.sock gunicorn -w 8 -k uvicorn.workers.UvicornWorker main:app
+#
+# Frames are an 8-byte header (JSON length, payload length), a JSON object and an
+# optional binary payload; embeddings travel as raw float32 rows. Requests carry an id,
+# so one connection per worker multiplexes all of that worker's calls.
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.embedding_batcher import EmbeddingBatcher
+from models.inference_queue import InferenceQueue, QueueFullError
+from models.schema_matcher import DEFAULT_MODEL_NAME
+
+DEFAULT_SOCKET_PATH = "/tmp/text2sql-models.sock"
+
+_HEADER = struct.Struct("!II")
+# Compiled llama.cpp grammars kept by the server, keyed by GBNF text.
+_MAX_GRAMMARS = 256
+
+
+class ModelServerError(Exception):
+    """A model call failed inside the model server."""
+
+
+def encode_frame(header: dict, payload: bytes = b"") -> bytes:
+    body = json.dumps(header).encode("utf-8")
+    return _HEADER.pack(len(body), len(payload)) + body + payload
+
+
+def _array_frame(header: dict, array: np.ndarray) -> bytes:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return encode_frame({**header, "shape": list(array.shape)}, array.tobytes())
+
+
+def _raise_for(header: dict):
+    if "error" in header:
+        if header.get("queue_full"):
+            raise QueueFullError(header["error"])
+        raise ModelServerError(header["error"])
+
+
+class ModelServer:
+    """
+    Serves one encoder and a pool of SQL generators to every API worker on the host.
+
+    Encodes of up to `embed_batch_size` texts from all connections go through one
+    EmbeddingBatcher, so concurrent questions from different workers share a forward
+    pass; larger encodes (index builds) run on their own. Generations from all
+    connections share one InferenceQueue: concurrency is `len(generators)`, at most
+    `max_queue` jobs wait host-wide, and a full queue is returned to the worker as
+    QueueFullError. A worker that cancels a stream or disconnects stops its decoding.
+    """
+
+    def __init__(self, socket_path: str, encoder, encoder_name: str, generators: List = (), max_queue: int = 8,
+                 embed_batch_size: int = 32, embed_max_wait_ms: float = 2.0, prefix_cache=None):
+        self.socket_path = socket_path
+        self.encoder = encoder
+        self.encoder_name = encoder_name
+        self.batcher = None
+        if embed_batch_size > 0:
+            self.batcher = EmbeddingBatcher(encoder, max_batch=embed_batch_size, max_wait_ms=embed_max_wait_ms)
+        self.inference_queue = InferenceQueue(list(generators), max_queue=max_queue) if generators else None
+        self.prefix_cache = prefix_cache
+        self._grammars = OrderedDict()
+        self._grammar_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    async def serve(self, ready: Optional[threading.Event] = None):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        # Only processes of the same user may use the models.
+        os.chmod(self.socket_path, 0o600)
+        logging.info(f"✅ Model server listening on {self.socket_path}")
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        write_lock = asyncio.Lock()
+        cancels: Dict[int, threading.Event] = {}
+        tasks = set()
+
+        async def send(frame: bytes):
+            async with write_lock:
+                writer.write(frame)
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    header_len, payload_len = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    header = json.loads(await reader.readexactly(header_len))
+                    if payload_len:
+                        await reader.readexactly(payload_len)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if header.get("op") == "cancel":
+                    event = cancels.get(header["id"])
+                    if event is not None:
+                        event.set()
+                    continue
+                task = asyncio.create_task(self._dispatch(header, send, cancels))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            # The worker went away: stop decoding for it.
+            for event in cancels.values():
+                event.set()
+            self.connections -= 1
+            writer.close()
+
+    async def _dispatch(self, header: dict, send, cancels: Dict[int, threading.Event]):
+        request_id = header["id"]
+        self.requests += 1
+        try:
+            op = header["op"]
+            if op == "encode":
+                frame = _array_frame({"id": request_id}, await self._encode(header["texts"]))
+            elif op == "generate":
+                frame = encode_frame({"id": request_id, **await self._generate(header, cancels)})
+            elif op == "generate_stream":
+                await self._generate_stream(header, send, cancels)
+                return
+            elif op == "info":
+                frame = encode_frame({"id": request_id, "encoder": self.encoder_name,
+                                      "generators": self.inference_queue.concurrency if self.inference_queue else 0})
+            elif op == "stats":
+                frame = encode_frame({"id": request_id, "stats": self.stats()})
+            else:
+                raise ValueError(f"Unknown op {op!r}")
+        except QueueFullError as e:
+            frame = encode_frame({"id": request_id, "error": str(e), "queue_full": True})
+        except Exception as e:
+            logging.error(f"Model server {header.get('op')} failed: {str(e)}")
+            frame = encode_frame({"id": request_id, "error": str(e)})
+        try:
+            await send(frame)
+        except ConnectionError:
+            pass
+
+    async def _encode(self, texts: List[str]) -> np.ndarray:
+        if self.batcher is not None and 0 < len(texts) <= self.batcher.max_batch:
+            rows = await asyncio.gather(*(asyncio.wrap_future(self.batcher.submit(text)) for text in texts))
+            return np.stack(rows)
+        return await asyncio.to_thread(self.encoder.encode, texts, convert_to_numpy=True)
+
+    def _queue(self) -> InferenceQueue:
+        if self.inference_queue is None:
+            raise ModelServerError("This model server has no SQL generator")
+        return self.inference_queue
+
+    def _grammar(self, text: Optional[str]):
+        if not text:
+            return None
+        with self._grammar_lock:
+            grammar = self._grammars.get(text)
+            if grammar is not None:
+                self._grammars.move_to_end(text)
+                return grammar
+
+        from llama_cpp import LlamaGrammar
+
+        grammar = LlamaGrammar.from_string(text, verbose=False)
+        with self._grammar_lock:
+            self._grammars[text] = grammar
+            while len(self._grammars) > _MAX_GRAMMARS:
+                self._grammars.popitem(last=False)
+        return grammar
+
+    async def _generate(self, header: dict, cancels: Dict[int, threading.Event]) -> dict:
+        request_id = header["id"]
+        # Set when the worker disconnects; a job still queued then never decodes.
+        cancel = cancels[request_id] = threading.Event()
+
+        def run(gen):
+            if cancel.is_set():
+                raise ModelServerError("Worker disconnected before generation started")
+            sql = gen.generate(question=header["question"], schema=header["schema"],
+                               grammar=self._grammar(header.get("grammar")))
+            return sql, getattr(gen, "last_timings", None)
+
+        try:
+            sql, timings = await self._queue().run(run)
+        finally:
+            cancels.pop(request_id, None)
+        return {"sql": sql, "timings": timings}
+
+    async def _generate_stream(self, header: dict, send, cancels: Dict[int, threading.Event]):
+        request_id = header["id"]
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        cancel = threading.Event()
+        cancels[request_id] = cancel
+
+        def produce(gen):
+            timings = None
+            try:
+                for event in gen.generate_stream(question=header["question"], schema=header["schema"],
+                                                 cancel_event=cancel, grammar=self._grammar(header.get("grammar"))):
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+                if not cancel.is_set():
+                    timings = getattr(gen, "last_timings", None)
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, {"error": str(e)})
+            finally:
+                loop.call_soon_threadsafe(events.put_nowait, ("end", timings))
+
+        try:
+            self._queue().submit(produce)
+            while True:
+                event = await events.get()
+                if isinstance(event, tuple):
+                    await send(encode_frame({"id": request_id, "done": True, "timings": event[1]}))
+                    return
+                await send(encode_frame({"id": request_id, "event": event}))
+        except ConnectionError:
+            cancel.set()
+        finally:
+            cancels.pop(request_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "requests": self.requests,
+            "embedding_batcher": self.batcher.stats() if self.batcher else None,
+            "inference_queue": self.inference_queue.stats() if self.inference_queue else None,
+            "prefix_cache": self.prefix_cache.stats() if self.prefix_cache else None,
+        }
+
+
+class ModelClient:
+    """
+    An API worker's connection to a ModelServer; safe to share between threads.
+
+    Calls are multiplexed over one socket and matched to responses by a reader
+    thread. `encode` follows SentenceTransformer.encode (numpy output), so the client
+    can stand in for the encoder model (e.g. SchemaMatcher(model=client)). A dropped
+    connection fails the calls in flight and is re-opened by the next call.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout_s: Optional[float] = None):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self._sock = None
+        self._connect_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._info = None
+
+    def _connection(self) -> socket.socket:
+        with self._connect_lock:
+            if self._sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                self._sock = sock
+                threading.Thread(target=self._read_loop, args=(sock,), name="model-client", daemon=True).start()
+            return self._sock
+
+    def _read_loop(self, sock: socket.socket):
+        reader = sock.makefile("rb")
+        try:
+            while True:
+                head = reader.read(_HEADER.size)
+                if len(head) < _HEADER.size:
+                    break
+                header_len, payload_len = _HEADER.unpack(head)
+                header = json.loads(reader.read(header_len))
+                payload = reader.read(payload_len) if payload_len else b""
+                entry = self._pending.get(header["id"])
+                if entry is None:
+                    continue
+                target = entry[1]
+                if isinstance(target, Future):
+                    self._pending.pop(header["id"], None)
+                    target.set_result((header, payload))
+                else:
+                    target.put((header, payload))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._connect_lock:
+                if self._sock is sock:
+                    self._sock = None
+            sock.close()
+            error = ConnectionError(f"Lost connection to the model server at {self.socket_path}")
+            for request_id, (owner, target) in list(self._pending.items()):
+                if owner is sock:
+                    self._pending.pop(request_id, None)
+                    if isinstance(target, Future):
+                        target.set_exception(error)
+                    else:
+                        target.put(error)
+
+    def _send(self, target, op: str, **fields) -> int:
+        request_id = next(self._ids)
+        sock = self._connection()
+        self._pending[request_id] = (sock, target)
+        try:
+            with self._send_lock:
+                sock.sendall(encode_frame({"id": request_id, "op": op, **fields}))
+        except OSError as e:
+            self._pending.pop(request_id, None)
+            raise ConnectionError(f"Could not reach the model server at {self.socket_path}: {e}") from e
+        return request_id
+
+    def call(self, op: str, timeout_s: Optional[float] = None, **fields):
+        """One request/response round trip; returns (header, payload)."""
+        future = Future()
+        request_id = self._send(future, op, **fields)
+        try:
+            header, payload = future.result(timeout=timeout_s or self.timeout_s)
+        except FutureTimeout:
+            # Not the builtin TimeoutError before Python 3.11. A late answer is dropped by the reader thread.
+            self._pending.pop(request_id, None)
+            raise
+        _raise_for(header)
+        return header, payload
+
+    def stream(self, op: str, **fields):
+        """Yield the response frames of a streaming request up to and including its `done` frame."""
+        frames = queue.Queue()
+        request_id = self._send(frames, op, **fields)
+        done = False
+        try:
+            while not done:
+                item = frames.get(timeout=self.timeout_s)
+                if isinstance(item, Exception):
+                    raise item
+                header, _ = item
+                _raise_for(header)
+                done = bool(header.get("done"))
+                yield header
+        finally:
+            self._pending.pop(request_id, None)
+            if not done:
+                # Closed early (client cancelled or failed): stop decoding on the server.
+                try:
+                    with self._send_lock:
+                        self._connection().sendall(encode_frame({"id": request_id, "op": "cancel"}))
+                except OSError:
+                    pass
+
+    def encode(self, sentences, convert_to_numpy=True, batch_size=None, **kwargs):
+        single = isinstance(sentences, str)
+        header, payload = self.call("encode", texts=[sentences] if single else list(sentences))
+        rows = np.frombuffer(payload, dtype=np.float32).reshape(header["shape"])
+        return rows[0] if single else rows
+
+    @property
+    def model_name(self) -> str:
+        """The server's encoder name, which also names the on-disk embedding indexes."""
+        if self._info is None:
+            self._info = self.call("info")[0]
+        return self._info["encoder"]
+
+    def stats(self, timeout_s: float = 5.0) -> dict:
+        return self.call("stats", timeout_s=timeout_s)[0]["stats"]
+
+
+class RemoteSQLGenerator:
+    """
+    SQLGenerator interface served by a ModelServer. `grammar` is GBNF text (see
+    SQLGrammarCache(compiled=False)); the server compiles and caches it.
+    """
+
+    def __init__(self, client: ModelClient):
+        self.client = client
+        self.last_timings = None
+
+    def generate(self, question: str, schema: str, grammar: Optional[str] = None) -> str:
+        header, _ = self.client.call("generate", question=question, schema=schema, grammar=grammar)
+        self.last_timings = header.get("timings")
+        return header["sql"]
+
+    def generate_stream(self, question: str, schema: str, cancel_event=None, grammar: Optional[str] = None):
+        self.last_timings = None
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        for header in self.client.stream("generate_stream", question=question, schema=schema, grammar=grammar):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if header.get("done"):
+                self.last_timings = header.get("timings")
+                return
+            if "error" in header["event"]:
+                raise ModelServerError(header["event"]["error"])
+            yield header["event"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the encoder and SQL generators to local API workers.")
+    parser.add_argument("--socket", default=os.getenv("MODEL_SERVER_SOCKET") or DEFAULT_SOCKET_PATH)
+    parser.add_argument("--encoder", default=DEFAULT_MODEL_NAME, help="SentenceTransformer model name")
+    parser.add_argument("--generators", type=int, default=int(os.getenv("SQL_GEN_CONCURRENCY", "1")),
+                        help="llama.cpp instances (0 = encoder only)")
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("SQL_GEN_MAX_QUEUE", "8")),
+                        help="generation jobs waiting host-wide before workers get 503s")
+    parser.add_argument("--prefix-cache-mb", type=int, default=int(os.getenv("PREFIX_CACHE_MB", "1024")))
+    parser.add_argument("--embed-batch-size", type=int, default=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")))
+    parser.add_argument("--embed-max-wait-ms", type=float, default=float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "2")))
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+    from sentence_transformers import SentenceTransformer
+    from models.generator_llm import SQLGenerator
+    from models.prefix_cache import PrefixKVCache
+
+    prefix_cache = PrefixKVCache(args.prefix_cache_mb * 1024 * 1024) if args.prefix_cache_mb > 0 else None
+    server = ModelServer(
+        args.socket, SentenceTransformer(args.encoder), args.encoder,
+        generators=[SQLGenerator(prefix_cache=prefix_cache) for _ in range(args.generators)],
+        max_queue=args.max_queue, embed_batch_size=args.embed_batch_size,
+        embed_max_wait_ms=args.embed_max_wait_ms, prefix_cache=prefix_cache)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
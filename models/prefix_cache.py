@@ -0,0 +1,76 @@
+# models/prefix_cache.py
+
+import threading
+from collections import OrderedDict
+
+
+def state_nbytes(state) -> int:
+    """Approximate resident size of a llama_cpp LlamaState (KV/state blob plus cached logits)."""
+    size = getattr(state, "llama_state_size", 0)
+    for name in ("input_ids", "scores"):
+        array = getattr(state, name, None)
+        size += getattr(array, "nbytes", 0)
+    return size
+
+
+class PrefixKVCache:
+    """
+    LRU cache of llama.cpp model states taken right after a prompt prefix was evaluated.
+
+    SQLGenerator keys entries by the rendered schema prefix of its prompt, so repeated
+    questions against the same database restore the prefix state and only prefill the
+    question suffix. The cache holds at most `capacity_bytes` of states and may be
+    shared by several SQLGenerator instances that load the same GGUF file.
+    """
+
+    def __init__(self, capacity_bytes: int):
+        self.capacity_bytes = capacity_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def record_hit(self):
+        """Count a hit served without a lookup (the prefix was already resident in the model)."""
+        with self._lock:
+            self.hits += 1
+
+    def put(self, key: str, state):
+        nbytes = state_nbytes(state)
+        if nbytes > self.capacity_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[1]
+            self._entries[key] = (state, nbytes)
+            self.size_bytes += nbytes
+            while self.size_bytes > self.capacity_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "capacity_bytes": self.capacity_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,102 @@
+# models/question_encoder.py
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from models.schema_index import normalize_rows
+
+
+def normalize_question(question: str) -> str:
+    """
+    Cache key for a question: trimmed, whitespace-collapsed and lowercased.
+    all-MiniLM-L6-v2 uses an uncased tokenizer, so lowercasing does not change the embedding.
+    """
+    return " ".join(question.lower().split())
+
+
+class QuestionEncoder:
+    """
+    Shared sentence encoder with a bounded LRU cache of question embeddings.
+
+    Embeddings are returned L2-normalized as read-only float32 vectors, so every
+    stage can score them against precomputed matrices with a dot product. Cache
+    misses go through `batcher` (an EmbeddingBatcher) when one is set.
+    """
+
+    def __init__(self, model, max_entries: int = 4096, batcher=None):
+        self.model = model
+        self.batcher = batcher
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str):
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+        return None
+
+    def _store(self, key: str, raw: np.ndarray) -> np.ndarray:
+        embedding = normalize_rows(raw)
+        embedding.flags.writeable = False
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return embedding
+
+    def encode(self, question: str) -> np.ndarray:
+        key = normalize_question(question)
+        embedding = self._lookup(key)
+        if embedding is not None:
+            return embedding
+        if self.batcher is not None:
+            return self._store(key, self.batcher.encode(key))
+        return self._store(key, self.model.encode(key, convert_to_numpy=True))
+
+    async def encode_async(self, question: str) -> np.ndarray:
+        """Like `encode`, but waits for the forward pass without blocking the event loop."""
+        key = normalize_question(question)
+        embedding = self._lookup(key)
+        if embedding is not None:
+            return embedding
+        if self.batcher is not None:
+            raw = await asyncio.wrap_future(self.batcher.submit(key))
+        else:
+            raw = await asyncio.to_thread(self.model.encode, key, convert_to_numpy=True)
+        return self._store(key, raw)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._cache), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class QuestionContext:
+    """Request-scoped question whose embedding is computed at most once and shared by all stages."""
+
+    def __init__(self, question: str, encoder: QuestionEncoder):
+        self.question = question
+        self.encoder = encoder
+        self._embedding = None
+
+    @property
+    def embedding(self) -> np.ndarray:
+        if self._embedding is None:
+            self._embedding = self.encoder.encode(self.question)
+        return self._embedding
+
+    async def embedding_async(self) -> np.ndarray:
+        if self._embedding is None:
+            self._embedding = await self.encoder.encode_async(self.question)
+        return self._embedding
@@ -0,0 +1,82 @@
+# models/registry.py
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+
+class ModelRegistry:
+    """
+    Named, lazily constructed models and other expensive resources.
+
+    Each registered factory runs at most once, on the first `get` or on an explicit
+    `warmup`; concurrent callers wait for the same load. `status` reports which
+    entries are resident, how long they took to load, and any load error.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._instances = {}
+        self._locks = {}
+        self._load_seconds = {}
+        self._errors = {}
+
+    def register(self, name: str, factory: Callable):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def names(self):
+        return list(self._factories)
+
+    def get(self, name: str):
+        if name in self._instances:
+            return self._instances[name]
+        with self._locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+            logging.info(f"Loading {name}...")
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self._errors[name] = str(e)
+                logging.error(f"Loading {name} failed: {str(e)}")
+                raise
+            self._load_seconds[name] = time.perf_counter() - start
+            self._errors.pop(name, None)
+            self._instances[name] = instance
+            logging.info(f"✅ Loaded {name} in {self._load_seconds[name]:.1f}s")
+            return instance
+
+    async def aget(self, name: str):
+        """`get` for async endpoints: a first-time load runs off the event loop."""
+        if name in self._instances:
+            return self._instances[name]
+        return await asyncio.to_thread(self.get, name)
+
+    def peek(self, name: str):
+        """The resident instance, or None without triggering a load."""
+        return self._instances.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def warmup(self, names: Optional[Iterable[str]] = None):
+        """Load the given entries (all by default) in registration order; errors are recorded, not raised."""
+        for name in names if names is not None else self.names():
+            try:
+                self.get(name)
+            except Exception:
+                pass
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "loaded": name in self._instances,
+                "load_seconds": self._load_seconds.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self._factories
+        }
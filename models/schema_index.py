@@ -0,0 +1,200 @@
+# models/schema_index.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+def content_hash(data) -> str:
+    """Stable hex digest for raw bytes or text."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def schema_fingerprint(schema_obj) -> str:
+    """Content hash of one tables.json entry, independent of key order."""
+    return content_hash(json.dumps(schema_obj, sort_keys=True))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize embedding rows so cosine similarity becomes a plain dot product."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        norm = np.linalg.norm(matrix)
+        return matrix / norm if norm > 0 else matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SchemaEmbeddingIndex:
+    """
+    On-disk store of normalized text embeddings, shared between processes via mmap.
+
+    Every build is written to `<index_dir>/<model>/<name>-<key>.npy` (the embedding
+    matrix) and a matching `.json` file (entry ids and per-entry text hashes). `key`
+    is derived from the source hash (e.g. the contents of tables.json), the model
+    name and the storage dtype. On a rebuild, rows whose text hash is unchanged are
+    copied from the previous build and only new or edited entries are re-encoded.
+
+    Each `source` (e.g. a tables.json path) keeps its own pointer to its latest
+    build, so processes indexing different files with the same model do not delete
+    each other's builds.
+    """
+
+    def __init__(self, index_dir: Optional[str], name: str, model_name: str, dtype: str = "float32",
+                 source: Optional[str] = None):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+        self.name = name
+        self.model_name = model_name
+        self.dtype = dtype
+        self.source = os.path.realpath(source) if source else None
+        self.index_dir = None
+        if index_dir:
+            model_slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            self.index_dir = os.path.join(index_dir, model_slug)
+
+    def load_or_build(
+        self,
+        source_hash: str,
+        ids: List[str],
+        texts: List[str],
+        encode: Callable[[List[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Return the (len(texts), dim) embedding matrix for `texts`, memory-mapped
+        read-only when it can be served from disk. `encode` is only called for
+        texts that have no stored embedding yet.
+        """
+        entry_hashes = [content_hash(text) for text in texts]
+
+        if self.index_dir is None:
+            return self._encode_rows(encode, texts)
+
+        key = content_hash(f"{self.model_name}:{self.dtype}:{source_hash}")[:16]
+        cached = self._load(key)
+        if cached is not None:
+            meta, matrix = cached
+            if meta["hashes"] == entry_hashes:
+                logging.info(f"Loaded {self.name} embedding index {key} ({len(texts)} entries)")
+                return matrix
+
+        previous = self._load_latest()
+        reuse = {}
+        if previous is not None:
+            prev_meta, prev_matrix = previous
+            reuse = {h: row for row, h in enumerate(prev_meta["hashes"])}
+
+        missing = [i for i, h in enumerate(entry_hashes) if h not in reuse]
+        new_rows = self._encode_rows(encode, [texts[i] for i in missing]) if missing else None
+
+        if new_rows is not None:
+            dim = new_rows.shape[1]
+        elif previous is not None:
+            dim = previous[1].shape[1]
+        else:
+            dim = 0
+
+        matrix = np.empty((len(texts), dim), dtype=self.dtype)
+        for i, h in enumerate(entry_hashes):
+            if h in reuse:
+                matrix[i] = previous[1][reuse[h]]
+        if missing:
+            matrix[missing] = new_rows
+
+        logging.info(
+            f"Built {self.name} embedding index {key}: "
+            f"{len(missing)} encoded, {len(texts) - len(missing)} reused"
+        )
+        self._save(key, list(ids), entry_hashes, matrix)
+        loaded = self._load(key)
+        return loaded[1] if loaded is not None else matrix
+
+    def _encode_rows(self, encode, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=self.dtype)
+        return normalize_rows(encode(texts)).astype(self.dtype, copy=False)
+
+    def _paths(self, key: str):
+        base = os.path.join(self.index_dir, f"{self.name}-{key}")
+        return base + ".npy", base + ".json"
+
+    def _pointer_path(self) -> str:
+        if self.source is None:
+            return os.path.join(self.index_dir, f"{self.name}-{self.dtype}.latest")
+        return os.path.join(self.index_dir, f"{self.name}-{self.dtype}-{content_hash(self.source)[:12]}.latest")
+
+    def _referenced_keys(self):
+        """Build keys that some source's pointer still names."""
+        keys = set()
+        for entry in os.listdir(self.index_dir):
+            if entry.startswith(f"{self.name}-") and entry.endswith(".latest"):
+                try:
+                    with open(os.path.join(self.index_dir, entry), "r") as f:
+                        keys.add(f.read().strip())
+                except OSError:
+                    pass
+        return keys
+
+    def _load(self, key: str):
+        matrix_path, meta_path = self._paths(key)
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable {self.name} index {key}: {e}")
+            return None
+        return meta, matrix
+
+    def _load_latest(self):
+        try:
+            with open(self._pointer_path(), "r") as f:
+                key = f.read().strip()
+        except OSError:
+            return None
+        return self._load(key) if key else None
+
+    def _save(self, key: str, ids: List[str], hashes: List[str], matrix: np.ndarray):
+        os.makedirs(self.index_dir, exist_ok=True)
+        matrix_path, meta_path = self._paths(key)
+        pid = os.getpid()
+
+        # Write to temp files and rename so concurrent workers never map a partial file;
+        # the .json is renamed last and marks the build as complete.
+        with open(f"{matrix_path}.{pid}.tmp", "wb") as f:
+            np.save(f, matrix)
+        os.replace(f"{matrix_path}.{pid}.tmp", matrix_path)
+
+        meta = {"model": self.model_name, "dtype": self.dtype, "ids": ids, "hashes": hashes}
+        with open(f"{meta_path}.{pid}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.{pid}.tmp", meta_path)
+
+        pointer = self._pointer_path()
+        try:
+            with open(pointer, "r") as f:
+                stale_key = f.read().strip()
+        except OSError:
+            stale_key = None
+        with open(f"{pointer}.{pid}.tmp", "w") as f:
+            f.write(key)
+        os.replace(f"{pointer}.{pid}.tmp", pointer)
+
+        # Workers that already mapped the previous build keep their view after unlink. Sources
+        # with identical contents share builds, so one still named by another pointer stays.
+        if stale_key and stale_key != key and stale_key not in self._referenced_keys():
+            for path in self._paths(stale_key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
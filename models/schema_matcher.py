@@ -1,46 +1,150 @@
 # 
 
-from sentence_transformers import SentenceTransformer, util
-import json
+import numpy as np
+
+from models.schema_index import SchemaEmbeddingIndex, normalize_rows
+from models.question_encoder import QuestionEncoder
+from models.ann_index import IVFIndex, top_k
+from models.embedding_batcher import EmbeddingBatcher
+from utils.schema_catalog import SchemaCatalog, matcher_text
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_INDEX_DIR = "artifacts/schema_index"
 
-class SchemaMatcher:
-    def __init__(self, tables_path):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
 
-        with open(tables_path, "r") as f:
-            self.schemas = json.load(f)
+class MatcherState:
+    """One immutable version of the matcher: a catalog and the embedding rows built from it."""
 
-        # Preprocess schemas: create full descriptions and precompute embeddings
-        self.db_texts = []
-        self.db_ids = []
-        self.schema_by_id = {}
-        for schema in self.schemas:
-            db_id = schema["db_id"]
-            schema_text = self._format_schema(schema)
-            self.db_texts.append(schema_text)
-            self.db_ids.append(db_id)
-            self.schema_by_id[db_id] = schema
+    def __init__(self, catalog, db_ids, db_embeddings, ann_index=None):
+        self.catalog = catalog
+        self.db_ids = db_ids
+        self.db_texts = [catalog.matcher_texts[db_id] for db_id in db_ids]
+        self.rows = {db_id: i for i, db_id in enumerate(db_ids)}
+        self.db_embeddings = db_embeddings
+        self.ann_index = ann_index
 
-        self.db_embeddings = self.model.encode(self.db_texts, convert_to_tensor=True)
+
+class SchemaMatcher:
+    def __init__(self, tables_path, model_name=DEFAULT_MODEL_NAME, index_dir=DEFAULT_INDEX_DIR, index_dtype="float32",
+                 ann_lists=None, ann_probe=8, batch_max_size=0, batch_max_wait_ms=2.0, model=None, catalog=None):
+        # `model` substitutes any object with a SentenceTransformer-style encode() (e.g. an
+        # offline stand-in); `model_name` still names its on-disk index.
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+        self.model = model
+        self.model_name = model_name
+        self.index_dir = index_dir
+        # The one encoder instance shared by every pipeline stage (see QuestionContext);
+        # batch_max_size > 0 micro-batches question encodes across concurrent requests.
+        self.batcher = None
+        if batch_max_size > 0:
+            self.batcher = EmbeddingBatcher(self.model, max_batch=batch_max_size, max_wait_ms=batch_max_wait_ms)
+        self.encoder = QuestionEncoder(self.model, batcher=self.batcher)
+
+        # Schemas and their matcher texts come from the shared catalog (loaded from
+        # `tables_path` when none is given).
+        catalog = catalog if catalog is not None else SchemaCatalog.from_file(tables_path)
+        db_ids = catalog.db_ids
+        self.ann_lists = ann_lists
+        self.ann_probe = ann_probe
+
+        # Normalized embeddings, memory-mapped from the on-disk index when available
+        # (index_dir=None keeps everything in memory).
+        index = SchemaEmbeddingIndex(index_dir, "schemas", model_name, dtype=index_dtype,
+                                     source=catalog.source_path or tables_path)
+        db_embeddings = index.load_or_build(catalog.source_hash, db_ids,
+                                            [catalog.matcher_texts[db_id] for db_id in db_ids], self._encode)
+        self.state = MatcherState(catalog, db_ids, db_embeddings, self._build_ann(db_embeddings))
+
+    # The current state's fields; a request that must not see a concurrent `apply`
+    # reads `state` once and passes it along.
+    catalog = property(lambda self: self.state.catalog)
+    schema_by_id = property(lambda self: self.state.catalog.raw)
+    schemas = property(lambda self: list(self.state.catalog.raw.values()))
+    db_ids = property(lambda self: self.state.db_ids)
+    db_texts = property(lambda self: self.state.db_texts)
+    db_embeddings = property(lambda self: self.state.db_embeddings)
+    ann_index = property(lambda self: self.state.ann_index)
+
+    def _build_ann(self, db_embeddings):
+        # Optional approximate index for large catalogs; ann_lists=None keeps exact search.
+        if self.ann_lists is None or len(db_embeddings) == 0:
+            return None
+        return IVFIndex(db_embeddings, n_lists=self.ann_lists, n_probe=self.ann_probe)
+
+    def _encode(self, texts):
+        return self.model.encode(texts, convert_to_numpy=True)
+
+    def apply(self, catalog) -> MatcherState:
+        """
+        Switch to `catalog`, re-encoding only databases that are new or whose schema
+        changed; other rows are copied from the current state. The IVF index keeps its
+        centroids and assigns only the new rows. Requests holding the previous state
+        are unaffected. Returns the new state.
+        """
+        old = self.state
+        if catalog is old.catalog:
+            return old
+        old_fingerprints = old.catalog.fingerprints
+        db_ids = catalog.db_ids
+        previous_rows = np.array([old.rows[db_id] if old_fingerprints.get(db_id) == catalog.fingerprints[db_id] else -1
+                                  for db_id in db_ids], dtype=np.int64)
+        kept = previous_rows >= 0
+        new_rows = np.flatnonzero(~kept)
+
+        encoded = None
+        if len(new_rows):
+            encoded = normalize_rows(self._encode([catalog.matcher_texts[db_ids[i]] for i in new_rows]))
+        dim = old.db_embeddings.shape[1] or (encoded.shape[1] if encoded is not None else 0)
+        db_embeddings = np.empty((len(db_ids), dim), dtype=old.db_embeddings.dtype)
+        db_embeddings[kept] = old.db_embeddings[previous_rows[kept]]
+        if encoded is not None:
+            db_embeddings[new_rows] = encoded
+
+        if old.ann_index is not None and len(db_ids):
+            ann_index = old.ann_index.updated(db_embeddings, previous_rows)
+        else:
+            ann_index = self._build_ann(db_embeddings)
+        self.state = MatcherState(catalog, db_ids, db_embeddings, ann_index)
+        return self.state
 
     def _format_schema(self, schema_obj):
-        lines = []
-        for i, table in enumerate(schema_obj['table_names_original']):
-            columns = [
-                col[1] for col in schema_obj['column_names_original']
-                if col[0] == i and col[1] != "*"
-            ]
-            if columns:
-                lines.append(f"Table {table}: {', '.join(columns)}")
-        return "\n".join(lines)
-
-    def match(self, question):
-        question_embedding = self.model.encode(question, convert_to_tensor=True)
-        scores = util.cos_sim(question_embedding, self.db_embeddings)[0]
-        best_idx = scores.argmax().item()
-        best_db_id = self.db_ids[best_idx]
-        best_schema_text = self.db_texts[best_idx]
+        return matcher_text(schema_obj)
+
+    def _search(self, question, k, question_embedding=None, n_probe=None, state=None):
+        state = state or self.state
+        if question_embedding is None:
+            question_embedding = self.encoder.encode(question)
+        if state.ann_index is not None:
+            ann = state.ann_index
+            wanted = min(k, len(state.db_embeddings))
+            probe = min(n_probe or ann.n_probe, ann.n_lists)
+            # Sparse clusters can hold fewer than k rows: widen the probe, then fall back to exact search.
+            while probe < ann.n_lists:
+                idx, scores = ann.search(question_embedding, k, n_probe=probe)
+                if len(idx) >= wanted:
+                    return idx, scores
+                probe *= 2
+        return top_k(state.db_embeddings @ question_embedding, k)
+
+    def match(self, question, question_embedding=None, state=None):
+        state = state or self.state
+        idx, _ = self._search(question, 1, question_embedding, state=state)
+        best_idx = int(idx[0])
+        best_db_id = state.db_ids[best_idx]
+        best_schema_text = state.db_texts[best_idx]
         return best_db_id, best_schema_text
+
+    def match_top_k(self, question, k=5, question_embedding=None, n_probe=None, state=None):
+        """
+        Return the k best (db_id, cosine score) pairs, best first. Uses the IVF index
+        when one was built (`n_probe` overrides its probe count), exact search otherwise;
+        the probe is widened if the probed clusters hold fewer than k rows.
+        """
+        state = state or self.state
+        idx, scores = self._search(question, k, question_embedding, n_probe, state=state)
+        return [(state.db_ids[i], float(score)) for i, score in zip(idx, scores)]
     
     def get_model(self):
         return self.model
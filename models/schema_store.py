@@ -0,0 +1,186 @@
+# models/schema_store.py
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from models.schema_index import schema_fingerprint
+
+
+class SchemaSnapshot:
+    """
+    One consistent version of the schemas: a SchemaCatalog plus the matcher and
+    sub-schema index states built from it (None until those models are loaded).
+    A request reads one snapshot up front and uses it for every stage.
+    """
+
+    def __init__(self, catalog, matcher=None, subschemas=None):
+        self.catalog = catalog
+        self.matcher = matcher
+        self.subschemas = subschemas
+
+    @property
+    def complete(self) -> bool:
+        return self.matcher is not None and self.subschemas is not None
+
+
+class SchemaStore:
+    """
+    Runtime add/replace/remove of database schemas without a restart.
+
+    `apply` derives a new catalog with only the affected entries re-parsed, brings
+    the resident SchemaMatcher and SubSchemaIndex up to date incrementally, then
+    publishes a new SchemaSnapshot with a single reference swap; requests holding
+    the previous snapshot finish against it. Listeners registered with
+    `add_listener(fn)` are called as `fn(changed_db_ids, catalog)` afterwards, e.g.
+    to invalidate per-database caches. Updates are serialized; with `persist_path`
+    each one is also written back to that tables.json.
+    """
+
+    def __init__(self, catalog, registry, matcher_name: str = "schema_matcher",
+                 subschema_name: str = "subschema_index", persist_path: Optional[str] = None):
+        self.registry = registry
+        self.persist_path = persist_path
+        self.matcher_name = matcher_name
+        self.subschema_name = subschema_name
+        self._snapshot = SchemaSnapshot(catalog)
+        self._lock = threading.Lock()
+        self._listeners: List[Callable] = []
+        self.updates = 0
+        self.last_update_seconds = None
+
+    @property
+    def catalog(self):
+        return self._snapshot.catalog
+
+    def add_listener(self, listener: Callable[[List[str], object], None]):
+        self._listeners.append(listener)
+
+    def snapshot(self) -> SchemaSnapshot:
+        """The current snapshot, loading the matcher and sub-schema index on first use."""
+        snapshot = self._snapshot
+        if snapshot.complete:
+            return snapshot
+        matcher = self.registry.get(self.matcher_name)
+        subschemas = self.registry.get(self.subschema_name)
+        with self._lock:
+            snapshot = self._snapshot
+            if not snapshot.complete:
+                # The models may have been built from an older catalog than the current one.
+                snapshot = SchemaSnapshot(snapshot.catalog, matcher.apply(snapshot.catalog),
+                                          subschemas.apply(snapshot.catalog))
+                self._snapshot = snapshot
+        return snapshot
+
+    async def asnapshot(self) -> SchemaSnapshot:
+        """`snapshot` for async endpoints: first-time model loads run off the event loop."""
+        snapshot = self._snapshot
+        if snapshot.complete:
+            return snapshot
+        await self.registry.aget(self.matcher_name)
+        await self.registry.aget(self.subschema_name)
+        return await asyncio.to_thread(self.snapshot)
+
+    def apply(self, upserts: Iterable[Dict] = (), removals: Iterable[str] = ()) -> Dict[str, List[str]]:
+        """
+        Add or replace the `upserts` tables.json entries and drop the `removals` db_ids.
+        Returns {"added", "replaced", "removed"} db_ids; entries identical to the current
+        ones are skipped. Raises KeyError for an unknown removal and ValueError when the
+        catalog would become empty.
+        """
+        upserts = list(upserts)
+        removals = list(removals)
+        with self._lock:
+            start = time.perf_counter()
+            old = self._snapshot.catalog
+            unknown = [db_id for db_id in removals if db_id not in old]
+            if unknown:
+                raise KeyError(f"Unknown databases: {', '.join(unknown)}")
+            upserts = [db for db in upserts if old.fingerprints.get(db["db_id"]) != schema_fingerprint(db)]
+            if not upserts and not removals:
+                return {"added": [], "replaced": [], "removed": []}
+            catalog = old.with_changes(upserts, removals)
+            if not len(catalog):
+                raise ValueError("Refusing to remove every database schema")
+
+            matcher = self.registry.peek(self.matcher_name)
+            subschemas = self.registry.peek(self.subschema_name)
+            self._snapshot = SchemaSnapshot(
+                catalog,
+                matcher.apply(catalog) if matcher is not None else None,
+                subschemas.apply(catalog) if subschemas is not None else None,
+            )
+            if self.persist_path:
+                catalog.save(self.persist_path)
+            self.updates += 1
+            self.last_update_seconds = time.perf_counter() - start
+
+        changes = {
+            "added": [db["db_id"] for db in upserts if db["db_id"] not in old],
+            "replaced": [db["db_id"] for db in upserts if db["db_id"] in old],
+            "removed": [db_id for db_id in removals if db_id not in catalog],
+        }
+        logging.info(f"Schema update in {self.last_update_seconds * 1000:.1f} ms: "
+                     + ", ".join(f"{len(ids)} {kind}" for kind, ids in changes.items()))
+        changed = changes["added"] + changes["replaced"] + changes["removed"]
+        for listener in self._listeners:
+            listener(changed, catalog)
+        return changes
+
+    def sync(self, entries: List[Dict]) -> Dict[str, List[str]]:
+        """Make the catalog hold exactly `entries` (a parsed tables.json)."""
+        upserts, removals = self.catalog.changes_from(entries)
+        return self.apply(upserts, removals)
+
+    def stats(self) -> dict:
+        return {
+            "databases": len(self.catalog),
+            "updates": self.updates,
+            "last_update_seconds": self.last_update_seconds,
+        }
+
+
+class SchemaFileWatcher:
+    """
+    Polls a tables.json every `interval_s` seconds and syncs a SchemaStore with it
+    when the file's modification time or size changes. A file that fails to parse
+    or apply is logged and retried on its next change.
+    """
+
+    def __init__(self, store: SchemaStore, tables_path: str, interval_s: float = 2.0):
+        self.store = store
+        self.tables_path = tables_path
+        self.interval_s = interval_s
+        self._stamp = self._file_stamp()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="schema-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+
+    def _file_stamp(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.tables_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            stamp = self._file_stamp()
+            if stamp is None or stamp == self._stamp:
+                continue
+            self._stamp = stamp
+            try:
+                with open(self.tables_path, "r") as f:
+                    entries = json.load(f)
+                self.store.sync(entries)
+            except Exception as e:
+                logging.error(f"Could not apply schema changes from {self.tables_path}: {str(e)}")
@@ -0,0 +1,198 @@
+# models/sql_cache.py
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from models.question_encoder import normalize_question
+
+
+class SQLCache:
+    """
+    Cache of generated SQL keyed by (db_id, normalized question).
+
+    Exact hits need the same question up to case and whitespace. With
+    `semantic_threshold` set, a miss falls back to the cached question of the same
+    database whose (normalized) embedding has the highest cosine similarity, if it
+    reaches the threshold. Entries are evicted LRU beyond `max_entries` and expire
+    after `ttl_seconds`. With `path`, entries are written through to a SQLite file
+    and reloaded on start. Every entry records the hash of its database schema, so
+    entries for a changed schema are dropped (see `sync_schemas`).
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = None,
+                 semantic_threshold: Optional[float] = None, path: Optional[str] = None,
+                 schema_hashes: Optional[Dict[str, str]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.schema_hashes = dict(schema_hashes or {})
+        self._entries = OrderedDict()  # (db_id, key) -> (sql, embedding, created_at)
+        self._by_db = {}  # db_id -> {key: embedding}
+        self._matrices = {}  # db_id -> (keys, matrix), rebuilt lazily after changes
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sql_cache ("
+                "db_id TEXT, question TEXT, sql TEXT, embedding BLOB, schema_hash TEXT, created_at REAL, "
+                "PRIMARY KEY (db_id, question))"
+            )
+            self._db.commit()
+            self._load()
+
+    def _load(self):
+        now = time.time()
+        rows = self._db.execute(
+            "SELECT db_id, question, sql, embedding, schema_hash, created_at FROM sql_cache ORDER BY created_at"
+        ).fetchall()
+        stale, evicted = [], []
+        for db_id, key, sql, blob, schema_hash, created_at in rows:
+            if self._expired(created_at, now) or schema_hash != self.schema_hashes.get(db_id):
+                stale.append((db_id, key))
+                continue
+            embedding = np.frombuffer(blob, dtype=np.float32) if blob else None
+            # Rows beyond max_entries (e.g. after lowering it) are evicted oldest first.
+            evicted.extend(self._insert(db_id, key, sql, embedding, created_at))
+        self._delete_persisted(stale + evicted)
+        logging.info(f"Loaded {len(self._entries)} cached SQL entries "
+                     f"({len(stale)} stale, {len(evicted)} evicted dropped)")
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _insert(self, db_id, key, sql, embedding, created_at):
+        self._entries[(db_id, key)] = (sql, embedding, created_at)
+        self._entries.move_to_end((db_id, key))
+        if embedding is not None:
+            self._by_db.setdefault(db_id, {})[key] = embedding
+            self._matrices.pop(db_id, None)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False)[0])
+            self._forget(*evicted[-1])
+            self.evictions += 1
+        return evicted
+
+    def _forget(self, db_id, key):
+        if key in self._by_db.get(db_id, {}):
+            del self._by_db[db_id][key]
+            self._matrices.pop(db_id, None)
+
+    def _remove(self, db_id, key):
+        self._entries.pop((db_id, key), None)
+        self._forget(db_id, key)
+
+    def _semantic_lookup(self, db_id, embedding):
+        if db_id not in self._matrices:
+            entries = self._by_db.get(db_id)
+            if not entries:
+                return None
+            keys = list(entries)
+            self._matrices[db_id] = (keys, np.stack([entries[k] for k in keys]))
+        keys, matrix = self._matrices[db_id]
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] >= self.semantic_threshold:
+            return keys[best]
+        return None
+
+    def get(self, db_id: str, question: str, question_embedding=None) -> Optional[str]:
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((db_id, key))
+            hit_key = key if entry is not None else None
+            semantic = False
+            if entry is None and self.semantic_threshold is not None and question_embedding is not None:
+                hit_key = self._semantic_lookup(db_id, question_embedding)
+                entry = self._entries.get((db_id, hit_key)) if hit_key is not None else None
+                semantic = entry is not None
+
+            if entry is not None and self._expired(entry[2], now):
+                self._remove(db_id, hit_key)
+                self._delete_persisted([(db_id, hit_key)])
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((db_id, hit_key))
+            if semantic:
+                self.semantic_hits += 1
+            else:
+                self.exact_hits += 1
+            return entry[0]
+
+    def put(self, db_id: str, question: str, sql: str, question_embedding=None, schema_hash: Optional[str] = None):
+        """`schema_hash` is the fingerprint the SQL was generated against; stale SQL is dropped."""
+        if self.max_entries <= 0:
+            return
+        if schema_hash is not None and schema_hash != self.schema_hashes.get(db_id):
+            return
+        key = normalize_question(question)
+        embedding = None
+        if question_embedding is not None:
+            embedding = np.asarray(question_embedding, dtype=np.float32)
+        created_at = time.time()
+        with self._lock:
+            self._remove(db_id, key)
+            evicted = self._insert(db_id, key, sql, embedding, created_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sql_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (db_id, key, sql, embedding.tobytes() if embedding is not None else None,
+                     self.schema_hashes.get(db_id), created_at)
+                )
+                self._delete_persisted(evicted, commit=False)
+                self._db.commit()
+
+    def _delete_persisted(self, keys, commit=True):
+        if self._db is None or not keys:
+            return
+        self._db.executemany("DELETE FROM sql_cache WHERE db_id = ? AND question = ?", keys)
+        if commit:
+            self._db.commit()
+
+    def invalidate(self, db_id: str):
+        """Drop every entry for `db_id`."""
+        with self._lock:
+            for entry_db, key in [k for k in self._entries if k[0] == db_id]:
+                self._remove(entry_db, key)
+            self._by_db.pop(db_id, None)
+            self._matrices.pop(db_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM sql_cache WHERE db_id = ?", (db_id,))
+                self._db.commit()
+
+    def sync_schemas(self, schema_hashes: Dict[str, str]):
+        """Adopt new per-database schema hashes, invalidating databases whose hash changed."""
+        changed = [db_id for db_id in set(self.schema_hashes) | set(schema_hashes)
+                   if self.schema_hashes.get(db_id) != schema_hashes.get(db_id)]
+        self.schema_hashes = dict(schema_hashes)
+        for db_id in changed:
+            self.invalidate(db_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,104 @@
+# models/subschema_index.py
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.schema_index import SchemaEmbeddingIndex, content_hash, normalize_rows
+from models.schema_matcher import DEFAULT_INDEX_DIR
+
+
+def table_descriptions(schema_obj: Dict) -> List[str]:
+    """One `table: col1, col2` line per table of a parsed schema (see load_parsed_schema)."""
+    return [f"{table}: {', '.join(cols)}" for table, cols in schema_obj["table_columns"].items()]
+
+
+def schema_lines(schema_text: str) -> List[str]:
+    """Non-empty, lowercased lines of a fine-grained schema text."""
+    return [line.strip() for line in schema_text.lower().splitlines() if line.strip()]
+
+
+class SubSchemaState:
+    """One immutable version of the index: a catalog and per-database embedding blocks."""
+
+    def __init__(self, catalog, tables: Dict[str, np.ndarray], lines: Dict[str, np.ndarray]):
+        self.catalog = catalog
+        self.tables = tables
+        self.lines = lines
+
+
+def _texts(catalog, db_ids):
+    """Table descriptions and schema lines of `db_ids`, with (db_id, n_tables, n_lines) spans."""
+    ids, texts, spans = [], [], []
+    for db_id in db_ids:
+        tables = table_descriptions(catalog.parsed[db_id])
+        lines = schema_lines(catalog.fine_grained_texts[db_id])
+        texts.extend(tables)
+        ids.extend(f"{db_id}:table:{i}" for i in range(len(tables)))
+        texts.extend(lines)
+        ids.extend(f"{db_id}:line:{i}" for i in range(len(lines)))
+        spans.append((db_id, len(tables), len(lines)))
+    return ids, texts, spans
+
+
+def _split(embeddings: np.ndarray, spans, tables: Dict, lines: Dict):
+    start = 0
+    for db_id, n_tables, n_lines in spans:
+        tables[db_id] = embeddings[start:start + n_tables]
+        lines[db_id] = embeddings[start + n_tables:start + n_tables + n_lines]
+        start += n_tables + n_lines
+
+
+class SubSchemaIndex:
+    """
+    Per-database table and schema-line embeddings, encoded once at load time.
+
+    `get_relevant_schema_prompt` ranks tables against `table_embeddings(db_id)` and
+    `is_question_relevant_to_schema` gates on `line_embeddings(db_id)`, so a request
+    only encodes its question. Rows are L2-normalized; the databases of the initial
+    catalog live in one matrix and each lookup returns a slice of it. `apply` encodes
+    only added or changed databases into a new state.
+    """
+
+    def __init__(self, catalog, model, model_name: str, index_dir=DEFAULT_INDEX_DIR, index_dtype="float32"):
+        self.model = model
+        ids, texts, spans = _texts(catalog, catalog.db_ids)
+        index = SchemaEmbeddingIndex(index_dir, "subschemas", model_name, dtype=index_dtype,
+                                     source=catalog.source_path)
+        encode = lambda batch: model.encode(batch, convert_to_numpy=True)
+        embeddings = index.load_or_build(content_hash("\n".join(ids + texts)), ids, texts, encode)
+        tables, lines = {}, {}
+        _split(embeddings, spans, tables, lines)
+        self.state = SubSchemaState(catalog, tables, lines)
+
+    @property
+    def schema_texts(self) -> Dict[str, str]:
+        # Fine-grained texts are rendered once by the SchemaCatalog.
+        return self.state.catalog.fine_grained_texts
+
+    def apply(self, catalog) -> SubSchemaState:
+        """Switch to `catalog`, encoding only new or changed databases; returns the new state."""
+        old = self.state
+        if catalog is old.catalog:
+            return old
+        old_fingerprints = old.catalog.fingerprints
+        changed = [db_id for db_id in catalog.db_ids if old_fingerprints.get(db_id) != catalog.fingerprints[db_id]]
+        changed_set = set(changed)
+        tables = {db_id: old.tables[db_id] for db_id in catalog.db_ids if db_id not in changed_set}
+        lines = {db_id: old.lines[db_id] for db_id in tables}
+        _, texts, spans = _texts(catalog, changed)
+        embeddings = np.empty((0, 0), dtype=np.float32)
+        if texts:
+            embeddings = normalize_rows(self.model.encode(texts, convert_to_numpy=True))
+        _split(embeddings, spans, tables, lines)
+        self.state = SubSchemaState(catalog, tables, lines)
+        return self.state
+
+    def __contains__(self, db_id) -> bool:
+        return db_id in self.state.tables
+
+    def table_embeddings(self, db_id: str, state: Optional[SubSchemaState] = None) -> np.ndarray:
+        return (state or self.state).tables[db_id]
+
+    def line_embeddings(self, db_id: str, state: Optional[SubSchemaState] = None) -> np.ndarray:
+        return (state or self.state).lines[db_id]
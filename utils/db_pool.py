@@ -0,0 +1,178 @@
+# utils/db_pool.py
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+_DB_ID_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class UnknownDatabase(KeyError):
+    """Raised when a db_id does not resolve to a database file."""
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the pool timeout."""
+
+
+class SQLitePool:
+    """
+    Per-database pools of reusable SQLite connections.
+
+    Databases are addressed by db_id and resolved Spider-style to
+    `<db_dir>/<db_id>/<db_id>.sqlite`; a missing db_id uses `default_path`.
+    Connections are opened read-only by default, keep their page cache and
+    prepared-statement cache (`cached_statements`) across requests, and are
+    tuned with `mmap_size` / `cache_size` pragmas. `journal_mode` (e.g. WAL)
+    is only applied to writable pools, since it is a persistent file setting.
+    """
+
+    def __init__(self, db_dir: Optional[str] = None, default_path: Optional[str] = None, size: int = 4,
+                 read_only: bool = True, journal_mode: Optional[str] = "WAL", mmap_size: int = 256 * 1024 * 1024,
+                 cache_size_kib: int = 64 * 1024, cached_statements: int = 256, timeout: float = 5.0):
+        self.db_dir = db_dir
+        self.default_path = default_path
+        self.size = max(1, size)
+        self.read_only = read_only
+        self.journal_mode = journal_mode
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        # Per-database idle connections; a None entry is a slot freed by a broken
+        # connection, which its taker fills with a new one.
+        self._idle = {}
+        self._created = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def database_path(self, db_id: Optional[str]) -> str:
+        if not db_id:
+            if not self.default_path:
+                raise UnknownDatabase("No db_id given and no default database configured")
+            return self.default_path
+        if not self.db_dir or not _DB_ID_PATTERN.match(db_id):
+            raise UnknownDatabase(f"Unknown database: {db_id}")
+        path = os.path.join(self.db_dir, db_id, f"{db_id}.sqlite")
+        if not os.path.exists(path):
+            raise UnknownDatabase(f"Unknown database: {db_id}")
+        return path
+
+    def connect(self, db_id: Optional[str]) -> sqlite3.Connection:
+        """Open a new, configured connection that is not managed by the pool."""
+        path = self.database_path(db_id)
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                                   cached_statements=self.cached_statements)
+            conn.execute("PRAGMA query_only = 1")
+        else:
+            conn = sqlite3.connect(path, check_same_thread=False, cached_statements=self.cached_statements)
+            if self.journal_mode:
+                conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kib)}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _acquire(self, db_id: Optional[str]) -> sqlite3.Connection:
+        key = db_id or ""
+        with self._lock:
+            idle = self._idle.setdefault(key, queue.LifoQueue())
+            freed = False
+            try:
+                conn = idle.get_nowait()
+                if conn is not None:
+                    self.reused += 1
+                    return conn
+                freed = True
+            except queue.Empty:
+                pass
+            create = not freed and self._created.get(key, 0) < self.size
+            if create:
+                self._created[key] = self._created.get(key, 0) + 1
+
+        if freed:
+            return self._reopen(db_id, key)
+        if create:
+            try:
+                conn = self.connect(db_id)
+            except Exception:
+                with self._lock:
+                    self._created[key] -= 1
+                raise
+            with self._lock:
+                self.opened += 1
+            return conn
+
+        try:
+            conn = idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No free connection for {db_id or 'default database'} after {self.timeout}s")
+        if conn is None:
+            return self._reopen(db_id, key)
+        with self._lock:
+            self.reused += 1
+        return conn
+
+    def _reopen(self, db_id: Optional[str], key: str) -> sqlite3.Connection:
+        """Open a connection for a slot handed over as None."""
+        try:
+            conn = self.connect(db_id)
+        except Exception:
+            # Pass the slot on so other waiters do not sit out their timeout.
+            self._idle[key].put(None)
+            raise
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _release(self, db_id: Optional[str], conn: sqlite3.Connection):
+        key = db_id or ""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            # Hand the slot to the next acquirer, waking a thread blocked on the idle queue.
+            self._idle[key].put(None)
+            return
+        self._idle[key].put(conn)
+
+    @contextmanager
+    def connection(self, db_id: Optional[str] = None):
+        """Borrow a connection for `db_id`; uncommitted work is rolled back on return."""
+        conn = self._acquire(db_id)
+        try:
+            yield conn
+        finally:
+            self._release(db_id, conn)
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                while True:
+                    try:
+                        conn = idle.get_nowait()
+                    except queue.Empty:
+                        break
+                    if conn is not None:
+                        conn.close()
+            self._idle.clear()
+            self._created.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "read_only": self.read_only,
+                "databases": len(self._created),
+                "connections": sum(self._created.values()),
+                "idle": sum(idle.qsize() for idle in self._idle.values()),
+                "opened": self.opened,
+                "reused": self.reused,
+            }
@@ -0,0 +1,249 @@
+# utils/metrics.py
+
+import bisect
+import contextvars
+import json
+import logging
+import math
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+# Seconds, from sub-millisecond lookups up to long generations.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_current_trace = contextvars.ContextVar("text2sql_trace", default=None)
+trace_logger = logging.getLogger("text2sql.trace")
+
+
+def _label_text(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_number(bound)}"'
+                    yield f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}"
+                yield f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}"
+                yield f"{self.name}_count{_label_text(self.labelnames, key)} {count}"
+
+
+class _Trace:
+    def __init__(self, name: str):
+        self.trace_id = secrets.token_hex(8)
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+
+    def add_span(self, name: str, start: float, seconds: float, **attributes):
+        span = {"name": name, "start_ms": round((start - self.start) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3)}
+        if attributes:
+            span.update(attributes)
+        self.spans.append(span)
+
+
+class Metrics:
+    """
+    Process-wide pipeline metrics in the Prometheus text format.
+
+    `stage` times a block into the `<namespace>_stage_seconds{stage=...}` histogram;
+    `observe_stage` records a duration measured elsewhere (e.g. on a generation worker
+    thread). `trace` wraps a request: a `trace_sample_rate` fraction of requests also
+    log their stage spans as one JSON line on the "text2sql.trace" logger. Collectors
+    registered with `add_collector` export component stats dicts as gauges.
+    """
+
+    def __init__(self, namespace: str = "text2sql", trace_sample_rate: float = 0.0):
+        self.namespace = namespace
+        self.trace_sample_rate = trace_sample_rate
+        self._metrics = []
+        self._collectors = []
+        self.stage_seconds = self.histogram("stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(f"{self.namespace}_{name}", documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Dict[str, Optional[dict]]]):
+        """`collect()` returns {component: stats dict or None}, as served by /stats."""
+        self._collectors.append(collect)
+
+    @contextmanager
+    def trace(self, name: str):
+        if not self.trace_sample_rate or random.random() >= self.trace_sample_rate:
+            yield None
+            return
+        trace = _Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace_logger.info(json.dumps({
+                "trace_id": trace.trace_id, "name": trace.name,
+                "duration_ms": round((time.perf_counter() - trace.start) * 1000, 3),
+                "spans": trace.spans, **trace.attributes,
+            }))
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start, start=start)
+
+    def observe_stage(self, name: str, seconds: float, start: Optional[float] = None, **attributes):
+        self.stage_seconds.observe(seconds, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, start if start is not None else time.perf_counter() - seconds, seconds, **attributes)
+
+    def annotate(self, **attributes):
+        """Attach attributes (e.g. db_id, token counts) to the current sampled trace."""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attributes.update(attributes)
+
+    def _collected(self) -> Iterable[str]:
+        gauges = {}
+        for collect in self._collectors:
+            for component, values in collect().items():
+                for key, value in (values or {}).items():
+                    if isinstance(value, dict):
+                        # e.g. {"models": {"schema_matcher": {"loaded": True, ...}}}
+                        for stat, sub_value in value.items():
+                            if isinstance(sub_value, (int, float)):
+                                name = f"{self.namespace}_{component}_{stat}"
+                                gauges.setdefault(name, []).append((f'{{name="{_escape(key)}"}}', sub_value))
+                    elif isinstance(value, (int, float)):
+                        gauges.setdefault(f"{self.namespace}_{component}_{key}", []).append(("", value))
+        for name, samples in sorted(gauges.items()):
+            yield f"# TYPE {name} gauge"
+            for labels, value in samples:
+                yield f"{name}{labels} {_number(float(value))}"
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(self._collected())
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request until its response starts, per matched
+    route, and counting responses by status. The request runs inside `metrics.trace`.
+    """
+
+    def __init__(self, app, metrics: Metrics, request_seconds: Histogram, requests_total: Counter):
+        self.app = app
+        self.metrics = metrics
+        self.request_seconds = request_seconds
+        self.requests_total = requests_total
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            observed = True
+            # The router stores the matched route in the shared scope.
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            self.request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+            self.requests_total.inc(endpoint=endpoint, status=status)
+
+        async def send_observed(message):
+            if message["type"] == "http.response.start" and not observed:
+                observe(message["status"])
+            await send(message)
+
+        with self.metrics.trace(f"{scope['method']} {scope['path']}"):
+            try:
+                await self.app(scope, receive, send_observed)
+            finally:
+                if not observed:
+                    observe(500)
@@ -2,6 +2,8 @@
 
 from typing import Dict
 
+from models.schema_index import normalize_rows
+
 def format_schema_prompt(db_schema: Dict) -> str:
     """
     Convert parsed schema dict into a structured text prompt for SQL generation.
@@ -25,4 +27,39 @@ def format_schema_prompt(db_schema: Dict) -> str:
             to_key = fk["to"]
             lines.append(f"  - {from_key} → {to_key}")
 
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
+
+
+def get_relevant_schema_prompt(question: str, schema_obj: dict, model,
+                               table_embeddings=None, question_embedding=None, tagged_tables=None) -> str:
+    """
+    `<tab>/<col>` rendering of the table most similar to the question. `tagged_tables`
+    are the database's memoized per-table renderings (SchemaCatalog.tagged_tables).
+    """
+    table_names = schema_obj["tables"]
+    table_columns = schema_obj["table_columns"]
+
+    if table_embeddings is not None:
+        # Precomputed, normalized table embeddings (SubSchemaIndex): only the question is encoded.
+        if question_embedding is None:
+            question_embedding = normalize_rows(model.encode(question, convert_to_numpy=True))
+        top_idx = int((table_embeddings @ question_embedding).argmax())
+    else:
+        from sentence_transformers import util
+
+        table_texts = [
+            f"{table}: {', '.join(cols)}" for table, cols in table_columns.items()
+        ]
+
+        question_embedding = model.encode(question, convert_to_tensor=True)
+        table_embeddings = model.encode(table_texts, convert_to_tensor=True)
+        scores = util.cos_sim(question_embedding, table_embeddings)[0]
+
+        top_idx = scores.argmax().item()
+    if tagged_tables is not None:
+        return tagged_tables[top_idx]
+    top_table = table_names[top_idx]
+    top_cols = table_columns[top_table]
+    col_str = ", ".join([f"<col>{col}</col>" for col in top_cols])
+
+    return f"<tab>{top_table}</tab>({col_str})"
@@ -0,0 +1,175 @@
+# utils/query_guard.py
+
+import math
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from utils.sql_postchecker import scan_identifiers
+
+_LOOP_STEP = re.compile(r"^(SCAN|SEARCH)\s+(?:TABLE\s+)?(\S+)")
+
+
+class QueryTimeout(Exception):
+    """Raised when a query exceeds its wall-clock budget and is interrupted."""
+
+
+class QueryRejected(Exception):
+    """Raised when plan admission rejects a query; `plan` holds the estimate."""
+
+    def __init__(self, message: str, plan: Dict):
+        super().__init__(message)
+        self.plan = plan
+
+
+class QueryGuard:
+    """
+    Wall-clock budgets and plan-based admission for SQL run through /execute-query.
+
+    `time_budget` installs a SQLite progress handler that aborts the statement once its
+    deadline passes (SQLite reports this as "interrupted"). `admit` runs
+    EXPLAIN QUERY PLAN and estimates the cost of each nested loop as the product of
+    its per-table row estimates (full table rows for SCAN, log2(rows) for SEARCH).
+    Loops with two or more full scans are flagged as cartesian; flagged plans above
+    `max_plan_cost` are rejected (`plan_check="reject"`) or reported
+    (`plan_check="warn"`).
+    """
+
+    def __init__(self, time_budget_s: Optional[float] = 5.0, plan_check: str = "warn",
+                 max_plan_cost: float = 1e8, progress_steps: int = 10000):
+        if plan_check not in ("off", "warn", "reject"):
+            raise ValueError(f"Unknown plan_check mode: {plan_check}")
+        self.time_budget_s = time_budget_s
+        self.plan_check = plan_check
+        self.max_plan_cost = max_plan_cost
+        self.progress_steps = progress_steps
+        self._row_counts = {}
+        self._lock = threading.Lock()
+        self.cancelled = 0
+        self.rejected = 0
+        self.warned = 0
+
+    @contextmanager
+    def time_budget(self, conn: sqlite3.Connection, seconds: Optional[float] = None):
+        seconds = self.time_budget_s if seconds is None else seconds
+        if not seconds:
+            yield
+            return
+        deadline = time.monotonic() + seconds
+        expired = []
+
+        def check_deadline():
+            if time.monotonic() > deadline:
+                expired.append(True)
+                return 1
+            return 0
+
+        conn.set_progress_handler(check_deadline, self.progress_steps)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if expired:
+                with self._lock:
+                    self.cancelled += 1
+                raise QueryTimeout(f"Query exceeded its {seconds:g}s time budget") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def _table_rows(self, conn: sqlite3.Connection, table: str) -> int:
+        db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+        key = (db_file, table.lower())
+        with self._lock:
+            if key in self._row_counts:
+                return self._row_counts[key]
+
+        rows = None
+        try:
+            stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? AND idx IS NULL", (table,)).fetchone()
+            if stat is None:
+                stat = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table,)).fetchone()
+            if stat is not None:
+                rows = int(str(stat[0]).split()[0])
+        except sqlite3.Error:
+            pass
+        if rows is None:
+            try:
+                with self.time_budget(conn):
+                    rows = conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+            except (sqlite3.Error, QueryTimeout):
+                rows = 0
+
+        with self._lock:
+            self._row_counts[key] = rows
+        return rows
+
+    def estimate(self, conn: sqlite3.Connection, sql: str) -> Dict:
+        """Estimate the plan cost of `sql`; returns {"cost", "cartesian", "steps"}."""
+        tables = {name.lower(): name for (name,) in
+                  conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        # Aliases come from FROM/JOIN lists only; subquery and CTE aliases map to None.
+        aliases = {alias: table for alias, table in
+                   scan_identifiers(sql, frozenset(tables))["aliases"].items() if table}
+
+        loops: Dict[int, List] = {}
+        steps = []
+        for _, parent, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            steps.append(detail)
+            match = _LOOP_STEP.match(detail)
+            if not match:
+                continue
+            kind, name = match.groups()
+            table = tables.get(name.lower()) or tables.get(aliases.get(name.lower(), "").lower())
+            if table is not None:
+                rows = self._table_rows(conn, table)
+            else:
+                # Unknown alias or subquery: assume the largest referenced table.
+                rows = max([self._table_rows(conn, t) for t in aliases.values() if t.lower() in tables] or [1])
+            loops.setdefault(parent, []).append((kind, max(rows, 1)))
+
+        cost = 0.0
+        cartesian = False
+        for loop in loops.values():
+            loop_cost = 1.0
+            for kind, rows in loop:
+                loop_cost *= rows if kind == "SCAN" else math.log2(rows) + 1
+            cost += loop_cost
+            if sum(1 for kind, _ in loop if kind == "SCAN") >= 2:
+                cartesian = True
+        return {"cost": cost, "cartesian": cartesian, "steps": steps}
+
+    def admit(self, conn: sqlite3.Connection, sql: str) -> List[str]:
+        """Check `sql` before execution; returns warnings or raises QueryRejected."""
+        if self.plan_check == "off":
+            return []
+        try:
+            plan = self.estimate(conn, sql)
+        except sqlite3.Error:
+            # Let execution report syntax errors and unknown tables.
+            return []
+        if not plan["cartesian"] or plan["cost"] <= self.max_plan_cost:
+            return []
+
+        message = (f"Query plan nests full table scans (estimated cost {plan['cost']:.3g} "
+                   f"> {self.max_plan_cost:.3g}); add a join condition or filter.")
+        if self.plan_check == "reject":
+            with self._lock:
+                self.rejected += 1
+            raise QueryRejected(message, plan)
+        with self._lock:
+            self.warned += 1
+        return [message]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "time_budget_s": self.time_budget_s,
+                "plan_check": self.plan_check,
+                "max_plan_cost": self.max_plan_cost,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+                "warned": self.warned,
+            }
@@ -0,0 +1,115 @@
+# utils/result_cache.py
+
+import json
+import os
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import sqlparse
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql: str) -> str:
+    """Cache key form of a query: comments stripped, keywords lowercased, whitespace collapsed."""
+    formatted = sqlparse.format(sql, keyword_case="lower", strip_comments=True)
+    parts = []
+    for statement in sqlparse.parse(formatted):
+        for token in statement.flatten():
+            if token.is_whitespace:
+                if parts and parts[-1] != " ":
+                    parts.append(" ")
+            else:
+                parts.append(token.value)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def data_version(db_path: str) -> Tuple:
+    """
+    Version stamp of a SQLite database file, shared by every connection. PRAGMA
+    data_version is per-connection and cannot be compared across pooled connections,
+    so the stamp is the mtime and size of the database file and of its WAL file.
+    """
+    stamp = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+class QueryResultCache:
+    """
+    LRU cache of /execute-query JSON responses keyed by (db_id, normalized SQL).
+
+    Each entry stores the database's `data_version` at execution time and is only
+    served while the file is unchanged. Entries are evicted least recently used to
+    stay within `max_bytes` (measured as the serialized response size).
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, db_id: Optional[str], sql: str, version: Tuple) -> Optional[dict]:
+        key = (db_id or "", normalize_sql(sql))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != version:
+                self._drop(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, db_id: Optional[str], sql: str, version: Tuple, response: dict):
+        nbytes = len(json.dumps(response, default=str))
+        if nbytes > self.max_bytes:
+            return
+        key = (db_id or "", normalize_sql(sql))
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (version, response, nbytes)
+            self.size_bytes += nbytes
+            while self.size_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[2]
+
+    def invalidate(self, db_id: Optional[str]):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == (db_id or "")]:
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,229 @@
+# utils/result_stream.py
+
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, List, Optional, Tuple
+
+from utils.query_guard import QueryTimeout
+
+
+def column_names(cursor) -> List[str]:
+    return [description[0] for description in cursor.description or []]
+
+
+def fetch_capped(cursor, max_rows: int, batch_size: int = 500) -> Tuple[List, bool]:
+    """Read at most `max_rows` rows in `fetchmany` batches; returns (rows, truncated)."""
+    rows = []
+    while len(rows) < max_rows:
+        batch = cursor.fetchmany(min(batch_size, max_rows - len(rows)))
+        if not batch:
+            return rows, False
+        rows.extend(batch)
+    return rows, cursor.fetchone() is not None
+
+
+class _SqliteTime:
+    """Charges only time spent inside SQLite calls against a QueryGuard's time budget."""
+
+    def __init__(self, guard, conn):
+        self.guard = guard
+        self.conn = conn
+        self.total = guard.time_budget_s if guard else None
+        self.remaining = self.total
+
+    @contextmanager
+    def budget(self):
+        if not self.total:
+            yield
+            return
+        started = time.monotonic()
+        try:
+            with self.guard.time_budget(self.conn, max(self.remaining, 1e-6)):
+                yield
+        except QueryTimeout as e:
+            raise QueryTimeout(f"Query exceeded its {self.total:g}s time budget") from e
+        finally:
+            self.remaining -= time.monotonic() - started
+
+
+def iter_ndjson(pool, db_id: Optional[str], sql: str, max_rows: int, batch_size: int = 500,
+                guard=None) -> Iterator[str]:
+    """
+    Run `sql` and stream the result as NDJSON: a `{"columns": [...]}` header line, one
+    JSON array per row, and a `{"row_count": n, "truncated": bool}` trailer. Rows are
+    read in `fetchmany` batches, so memory stays flat regardless of result size. The
+    pooled connection is held until the stream is exhausted or closed.
+
+    With a QueryGuard, the plan is admitted first (warnings go into the header) and the
+    time spent in `execute` and `fetchmany` counts against its time budget; time spent
+    waiting for a slow client to consume the stream does not. A timeout after the
+    header has been sent ends the stream with an `"error"` in the trailer.
+    """
+    with pool.connection(db_id) as conn:
+        warnings = guard.admit(conn, sql) if guard else []
+        sqlite_time = _SqliteTime(guard, conn)
+        with sqlite_time.budget():
+            cursor = conn.execute(sql)
+        try:
+            header = {"columns": column_names(cursor)}
+            if warnings:
+                header["warnings"] = warnings
+            yield json.dumps(header) + "\n"
+            sent = 0
+            truncated = False
+            try:
+                while sent < max_rows:
+                    with sqlite_time.budget():
+                        batch = cursor.fetchmany(min(batch_size, max_rows - sent))
+                    if not batch:
+                        break
+                    sent += len(batch)
+                    yield "".join(json.dumps(list(row)) + "\n" for row in batch)
+                else:
+                    with sqlite_time.budget():
+                        truncated = cursor.fetchone() is not None
+            except Exception as e:
+                yield json.dumps({"row_count": sent, "truncated": True, "error": str(e)}) + "\n"
+                return
+            yield json.dumps({"row_count": sent, "truncated": truncated}) + "\n"
+        finally:
+            cursor.close()
+
+
+class CursorExpired(KeyError):
+    """Raised for an unknown, exhausted or expired pagination cursor."""
+
+
+class TooManyCursors(Exception):
+    """Raised when `max_open` pagination cursors are already open."""
+
+
+class _OpenCursor:
+    def __init__(self, conn, cursor, columns):
+        self.conn = conn
+        self.cursor = cursor
+        self.columns = columns
+        self.pending = []
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class CursorRegistry:
+    """
+    Server-side cursors for paginated results.
+
+    `open` executes the query on a dedicated read connection and returns the first
+    page plus an opaque `next_cursor` token; `next_page` continues from the live
+    SQLite cursor, so each page costs one `fetchmany` and no re-execution. Page size
+    is capped at `max_page_rows`. Cursors idle longer than `ttl_seconds` are closed,
+    and at most `max_open` may be open at once. With a QueryGuard, `open` admits the
+    plan and the execution and every page fetch run under its time budget.
+
+    A live cursor keeps a read transaction open on its connection, and in WAL mode
+    that stops checkpoints from resetting the WAL past its snapshot, so keep
+    `ttl_seconds` short; expired cursors are closed on the next `open`/`next_page`.
+    """
+
+    def __init__(self, pool, max_page_rows: int = 1000, max_open: int = 64, ttl_seconds: float = 60.0,
+                 guard=None):
+        self.pool = pool
+        self.guard = guard
+        self.max_page_rows = max_page_rows
+        self.max_open = max_open
+        self.ttl_seconds = ttl_seconds
+        self._cursors = {}
+        self._opening = 0
+        self._lock = threading.Lock()
+
+    def _page_size(self, requested: Optional[int]) -> int:
+        if not requested or requested <= 0:
+            return self.max_page_rows
+        return min(requested, self.max_page_rows)
+
+    def open(self, db_id: Optional[str], sql: str, page_size: Optional[int] = None) -> dict:
+        self._sweep()
+        with self._lock:
+            # Reserve the slot up front so concurrent opens cannot overshoot max_open.
+            if len(self._cursors) + self._opening >= self.max_open:
+                raise TooManyCursors(f"{len(self._cursors) + self._opening} result cursors already open")
+            self._opening += 1
+
+        token = secrets.token_urlsafe(16)
+        try:
+            conn = self.pool.connect(db_id)
+            try:
+                warnings = self.guard.admit(conn, sql) if self.guard else []
+                with self._budget(conn):
+                    cursor = conn.execute(sql)
+            except Exception:
+                conn.close()
+                raise
+            entry = _OpenCursor(conn, cursor, column_names(cursor))
+            with self._lock:
+                self._cursors[token] = entry
+                self._opening -= 1
+        except Exception:
+            with self._lock:
+                self._opening -= 1
+            raise
+        page = self._page(token, entry, self._page_size(page_size))
+        if warnings:
+            page["warnings"] = warnings
+        return page
+
+    def _budget(self, conn):
+        return self.guard.time_budget(conn) if self.guard else nullcontext()
+
+    def next_page(self, token: str, page_size: Optional[int] = None) -> dict:
+        self._sweep()
+        with self._lock:
+            entry = self._cursors.get(token)
+        if entry is None:
+            raise CursorExpired(f"Unknown or expired cursor: {token}")
+        return self._page(token, entry, self._page_size(page_size))
+
+    def _page(self, token: str, entry: _OpenCursor, page_size: int) -> dict:
+        failure = None
+        with entry.lock:
+            # Read one row ahead so the last page reports no next cursor.
+            try:
+                with self._budget(entry.conn):
+                    rows = entry.pending + entry.cursor.fetchmany(page_size + 1 - len(entry.pending))
+                page, entry.pending = rows[:page_size], rows[page_size:]
+                entry.last_used = time.monotonic()
+            except Exception as e:
+                failure = e
+        if failure is not None:
+            self.close(token)
+            raise failure
+        has_more = bool(entry.pending)
+        if not has_more:
+            self.close(token)
+        return {
+            "columns": entry.columns,
+            "rows": [list(row) for row in page],
+            "next_cursor": token if has_more else None,
+        }
+
+    def close(self, token: str):
+        with self._lock:
+            entry = self._cursors.pop(token, None)
+        if entry is not None:
+            with entry.lock:
+                entry.cursor.close()
+                entry.conn.close()
+
+    def _sweep(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [token for token, entry in self._cursors.items() if entry.last_used < cutoff]
+        for token in expired:
+            self.close(token)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open_cursors": len(self._cursors), "max_open": self.max_open,
+                    "max_page_rows": self.max_page_rows}
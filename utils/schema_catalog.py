@@ -0,0 +1,199 @@
+# utils/schema_catalog.py
+
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.schema_index import content_hash, schema_fingerprint
+from utils.fine_grained_schema import get_fine_grained_schema
+from utils.prompt_formatter import format_schema_prompt
+from utils.schema_parser import parse_schema
+
+DEFAULT_SNAPSHOT_DIR = "artifacts/schema_catalog"
+
+# Bump when the snapshot layout or a precomputed rendering changes.
+SNAPSHOT_VERSION = 2
+# The per-entry values a snapshot stores: the costly ones. Entries are re-read from
+# tables.json and parse_schema is cheap.
+_SNAPSHOT_KEYS = ("fingerprints", "matcher_texts", "fine_grained_texts")
+
+
+def matcher_text(schema_obj: Dict) -> str:
+    """`Table t: c1, c2` per table that has columns; one pass over the column list."""
+    columns = [[] for _ in schema_obj["table_names_original"]]
+    for table_idx, name in schema_obj["column_names_original"]:
+        if table_idx >= 0 and name != "*":
+            columns[table_idx].append(name)
+    return "\n".join(
+        f"Table {table}: {', '.join(cols)}"
+        for table, cols in zip(schema_obj["table_names_original"], columns) if cols
+    )
+
+
+def tag_table(table: str, columns: List[str]) -> str:
+    return f"<tab>{table}</tab>(" + ", ".join(f"<col>{col}</col>" for col in columns) + ")"
+
+
+class SchemaCatalog:
+    """
+    Every database of a tables.json, parsed once and shared by all pipeline stages.
+
+    Per db_id it holds the raw entry (`raw`), the load_parsed_schema structure
+    (`parsed`), a content fingerprint, and the two texts every load needs: the
+    matcher text and the fine-grained schema text. The `<tab>/<col>` renderings and
+    format_schema_prompt are built on first use and memoized. `from_file` keeps one
+    JSON snapshot of the fingerprints and texts per source file under
+    `snapshot_dir`, valid while the file's content hash matches, so later loads skip
+    fingerprinting and rendering. `source_path` is the tables.json
+    the catalog was loaded from, if any.
+    """
+
+    def __init__(self, entries: List[Dict], source_hash: str, source_path: Optional[str] = None):
+        self.source_hash = source_hash
+        self.source_path = source_path
+        self.raw = {db["db_id"]: db for db in entries}
+        self.parsed = {db_id: parse_schema(db) for db_id, db in self.raw.items()}
+        self.fingerprints = {db_id: schema_fingerprint(db) for db_id, db in self.raw.items()}
+        self.matcher_texts = {db_id: matcher_text(db) for db_id, db in self.raw.items()}
+        self.fine_grained_texts = {db_id: get_fine_grained_schema(db) for db_id, db in self.raw.items()}
+        self._reset_renderings()
+
+    def _reset_renderings(self):
+        self._tagged = {}
+        self._prompts = {}
+
+    @classmethod
+    def from_file(cls, tables_path: str, snapshot_dir: Optional[str] = DEFAULT_SNAPSHOT_DIR) -> "SchemaCatalog":
+        with open(tables_path, "rb") as f:
+            raw = f.read()
+        source_hash = content_hash(raw)
+        entries = json.loads(raw)
+        if not snapshot_dir:
+            return cls(entries, source_hash, tables_path)
+
+        # One snapshot per source path, so files sharing a basename keep their own.
+        stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.splitext(os.path.basename(tables_path))[0])
+        source_id = content_hash(os.path.realpath(tables_path))[:16]
+        path = os.path.join(snapshot_dir, f"{stem}-{source_id}.json")
+        catalog = cls._load_snapshot(path, source_hash, entries)
+        if catalog is not None:
+            catalog.source_path = tables_path
+            logging.info(f"Loaded schema catalog snapshot {path} ({len(catalog)} databases)")
+            return catalog
+
+        catalog = cls(entries, source_hash, tables_path)
+        catalog._save_snapshot(path)
+        return catalog
+
+    @classmethod
+    def _load_snapshot(cls, path: str, source_hash: str, entries: List[Dict]) -> Optional["SchemaCatalog"]:
+        try:
+            with open(path, "r") as f:
+                # Only trust snapshots written by this user; the texts end up in prompts.
+                if hasattr(os, "getuid") and os.fstat(f.fileno()).st_uid != os.getuid():
+                    logging.warning(f"Ignoring schema catalog snapshot {path} owned by another user")
+                    return None
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable schema catalog snapshot {path}: {e}")
+            return None
+        if state.get("version") != SNAPSHOT_VERSION or state.get("source_hash") != source_hash:
+            return None
+        catalog = cls.__new__(cls)
+        catalog.source_hash = source_hash
+        catalog.raw = {db["db_id"]: db for db in entries}
+        if any(state[key].keys() != catalog.raw.keys() for key in _SNAPSHOT_KEYS):
+            return None
+        catalog.parsed = {db_id: parse_schema(db) for db_id, db in catalog.raw.items()}
+        for key in _SNAPSHOT_KEYS:
+            setattr(catalog, key, state[key])
+        catalog._reset_renderings()
+        return catalog
+
+    def _save_snapshot(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        state = {"version": SNAPSHOT_VERSION, "source_hash": self.source_hash,
+                 **{key: getattr(self, key) for key in _SNAPSHOT_KEYS}}
+        # Written in place of this source's previous snapshot; other sources' files are untouched.
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+        logging.info(f"Saved schema catalog snapshot {path} ({len(self)} databases)")
+
+    def with_changes(self, upserts: Iterable[Dict] = (), removals: Iterable[str] = ()) -> "SchemaCatalog":
+        """
+        A new catalog with `upserts` (tables.json entries) added or replaced and the
+        `removals` db_ids dropped. Only those entries are parsed and rendered; the rest,
+        including their memoized renderings, are shared with this catalog, which is left
+        unchanged for readers still holding it.
+        """
+        upserts = {db["db_id"]: db for db in upserts}
+        removals = set(removals) - set(upserts)
+        # Build the new entries first so a malformed one leaves nothing half-applied.
+        built = {db_id: (parse_schema(db), schema_fingerprint(db), matcher_text(db), get_fine_grained_schema(db))
+                 for db_id, db in upserts.items()}
+
+        catalog = SchemaCatalog.__new__(SchemaCatalog)
+        catalog.raw = {db_id: db for db_id, db in self.raw.items() if db_id not in removals}
+        catalog.raw.update(upserts)
+        dropped = removals | set(upserts)
+        for key, position in (("parsed", 0), ("fingerprints", 1), ("matcher_texts", 2), ("fine_grained_texts", 3)):
+            values = {db_id: value for db_id, value in getattr(self, key).items() if db_id in catalog.raw}
+            values.update((db_id, entry[position]) for db_id, entry in built.items())
+            setattr(catalog, key, values)
+        catalog._tagged = {db_id: value for db_id, value in self._tagged.items() if db_id not in dropped}
+        catalog._prompts = {db_id: value for db_id, value in self._prompts.items() if db_id not in dropped}
+        catalog.source_hash = content_hash("\n".join(f"{db_id}:{fp}" for db_id, fp in catalog.fingerprints.items()))
+        catalog.source_path = self.source_path
+        return catalog
+
+    def changes_from(self, entries: Iterable[Dict]) -> Tuple[List[Dict], List[str]]:
+        """(upserts, removals) that turn this catalog into one holding exactly `entries`."""
+        seen = set()
+        upserts = []
+        for db in entries:
+            seen.add(db["db_id"])
+            if self.fingerprints.get(db["db_id"]) != schema_fingerprint(db):
+                upserts.append(db)
+        return upserts, [db_id for db_id in self.raw if db_id not in seen]
+
+    def save(self, tables_path: str):
+        """Write the entries back as a tables.json, atomically."""
+        tmp = f"{tables_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(list(self.raw.values()), f)
+        os.replace(tmp, tables_path)
+
+    def __contains__(self, db_id) -> bool:
+        return db_id in self.raw
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    @property
+    def db_ids(self) -> List[str]:
+        return list(self.raw)
+
+    def tagged_tables(self, db_id: str) -> Tuple[str, ...]:
+        """`<tab>t</tab>(<col>c</col>, ...)` for each table, in table order."""
+        tagged = self._tagged.get(db_id)
+        if tagged is None:
+            tagged = tuple(tag_table(table, cols) for table, cols in self.parsed[db_id]["table_columns"].items())
+            self._tagged[db_id] = tagged
+        return tagged
+
+    def tagged_schema(self, db_id: str) -> str:
+        return "\n".join(self.tagged_tables(db_id))
+
+    def schema_prompt(self, db_id: str) -> str:
+        """format_schema_prompt of the database, memoized."""
+        prompt = self._prompts.get(db_id)
+        if prompt is None:
+            prompt = self._prompts[db_id] = format_schema_prompt(self.parsed[db_id])
+        return prompt
+
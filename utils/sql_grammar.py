@@ -0,0 +1,126 @@
+# utils/sql_grammar.py
+
+import json
+import re
+import threading
+from typing import Dict, List, Optional
+
+# SQL subset the generator may emit after the prompt's trailing "select ". Identifiers are
+# filled in per database: `table` and `column` list the schema's names and `qualified`
+# only allows `table.column` pairs that exist.
+_SQL_RULES = r'''
+root ::= select-core compound* ";"?
+compound ::= ws set-op ws "select" ws select-core
+set-op ::= "union all" | "union" | "intersect" | "except"
+select-core ::= ("distinct" ws)? select-list ws "from" ws from-clause (ws where-clause)? (ws group-clause)? (ws order-clause)? (ws limit-clause)?
+select-list ::= expr (ws? "," ws? expr)*
+from-clause ::= table-ref (ws join-clause)* | table-ref (ws? "," ws? table-ref)+
+table-ref ::= table | "(" ws? "select" ws select-core ws? ")"
+join-clause ::= (("left" | "inner") ws)? "join" ws table-ref (ws "on" ws condition)?
+where-clause ::= "where" ws condition
+group-clause ::= "group by" ws expr (ws? "," ws? expr)* (ws "having" ws condition)?
+order-clause ::= "order by" ws order-item (ws? "," ws? order-item)*
+order-item ::= expr (ws ("asc" | "desc"))?
+limit-clause ::= "limit" ws number
+condition ::= predicate (ws ("and" | "or") ws predicate)*
+predicate ::= ("not" ws)? (comparison | like | in-list | between | null-check | "(" ws? condition ws? ")")
+comparison ::= expr ws? compare-op ws? expr
+compare-op ::= "=" | "!=" | "<>" | "<=" | ">=" | "<" | ">"
+like ::= expr ws ("not" ws)? "like" ws string
+in-list ::= expr ws ("not" ws)? "in" ws? "(" ws? ("select" ws select-core | value (ws? "," ws? value)*) ws? ")"
+between ::= expr ws "between" ws expr ws "and" ws expr
+null-check ::= expr ws "is" ws ("not" ws)? "null"
+expr ::= term (ws? arith-op ws? term)*
+arith-op ::= "+" | "-" | "*" | "/"
+term ::= column-ref | value | aggregate | "*" | "(" ws? "select" ws select-core ws? ")"
+aggregate ::= agg-fn "(" ws? ("distinct" ws)? (expr | "*") ws? ")"
+agg-fn ::= "count" | "sum" | "avg" | "min" | "max"
+column-ref ::= qualified | column
+value ::= number | string
+number ::= "-"? [0-9]+ ("." [0-9]+)?
+string ::= "'" [^'\n]* "'" | "\"" [^"\n]* "\""
+ws ::= [ \n] " "*
+'''
+
+
+def _literal(text: str) -> str:
+    """GBNF string literal (JSON escaping is compatible with GBNF's)."""
+    return json.dumps(text)
+
+
+def _identifier_alternatives(name: str) -> List[str]:
+    """Accepted spellings of a schema identifier: as written and lowercased, quoted if needed."""
+    spellings = []
+    for variant in dict.fromkeys([name, name.lower()]):
+        if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", variant):
+            spellings.append(_literal(variant))
+        spellings.append(_literal(f'"{variant}"'))
+    return spellings
+
+
+def compile_sql_grammar(db_schema: Dict) -> Optional[str]:
+    """
+    Compile a parsed schema (see load_parsed_schema) into a GBNF grammar that only
+    admits that database's table and column names. Returns None for an empty schema.
+    """
+    tables = [table for table in db_schema["tables"] if table]
+    columns = sorted({col for cols in db_schema["table_columns"].values() for col in cols})
+    if not tables or not columns:
+        return None
+
+    lines = [_SQL_RULES.strip()]
+    lines.append("table ::= " + " | ".join(
+        alt for table in tables for alt in _identifier_alternatives(table)))
+    lines.append("column ::= " + " | ".join(
+        alt for col in columns for alt in _identifier_alternatives(col)))
+
+    qualified = []
+    for i, table in enumerate(tables):
+        table_cols = db_schema["table_columns"].get(table, [])
+        if not table_cols:
+            continue
+        rule = f"tcols-{i}"
+        lines.append(f"{rule} ::= " + " | ".join(
+            alt for col in table_cols for alt in _identifier_alternatives(col)))
+        for alt in _identifier_alternatives(table):
+            qualified.append(f'{alt} "." {rule}')
+    lines.append("qualified ::= " + " | ".join(qualified))
+
+    return "\n".join(lines) + "\n"
+
+
+class SQLGrammarCache:
+    """
+    Compiled llama.cpp grammars per db_id; entries are built on first use and rebuilt
+    when called with a different schema object (a replaced schema). With
+    `compiled=False` the GBNF text is cached instead, for a generator in another
+    process (see models/model_server.py) to compile.
+    """
+
+    def __init__(self, compiled: bool = True):
+        self.compiled = compiled
+        self._grammars = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_id: str, db_schema: Dict):
+        with self._lock:
+            entry = self._grammars.get(db_id)
+            if entry is not None and entry[0] is db_schema:
+                return entry[1]
+
+        text = compile_sql_grammar(db_schema)
+        if self.compiled:
+            from llama_cpp import LlamaGrammar
+            grammar = LlamaGrammar.from_string(text, verbose=False) if text else None
+        else:
+            grammar = text or None
+        with self._lock:
+            self._grammars[db_id] = (db_schema, grammar)
+        return grammar
+
+    def invalidate(self, db_id: str):
+        with self._lock:
+            self._grammars.pop(db_id, None)
+
+    def __len__(self) -> int:
+        return len(self._grammars)
@@ -1,9 +1,16 @@
 # utils/sql_postchecker.py
 
+import threading
 import sqlparse
+from sqlparse.lexer import Lexer
 from sqlparse.sql import IdentifierList, Identifier, TokenList, Function
-from sqlparse.tokens import Keyword, DML
-from typing import Dict, Set
+from sqlparse.tokens import Keyword, DML, Name, Punctuation, String, Whitespace, Comment, Wildcard
+from typing import Dict, List, Set
+
+# Keywords that start a clause; never read as an identifier even if a column has that name.
+_CLAUSE_KEYWORDS = {"select", "from", "where", "group by", "order by", "having", "limit", "offset", "on", "using",
+                    "as", "and", "or", "not", "in", "is", "null", "like", "between", "union", "intersect",
+                    "except", "with", "case", "when", "then", "else", "end", "distinct", "all", "exists"}
 
 
 def extract_identifiers(token_list) -> Set[str]:
@@ -63,24 +70,205 @@ def get_tables_and_columns_from_sql(sql: str):
     return tables, columns
 
 
-def validate_sql_against_schema(sql: str, db_schema: Dict) -> bool:
+def _unquote(name: str) -> str:
+    if len(name) > 1 and name[0] + name[-1] in ('""', "``", "[]"):
+        name = name[1:-1]
+    return name.lower()
+
+
+def scan_identifiers(sql: str, known: frozenset = frozenset()) -> Dict:
     """
-    Validates that all tables and columns used in SQL exist in the schema.
+    Single pass over the lexer tokens of `sql` (no parse tree). Returns
+    {"tables", "aliases", "derived", "qualified", "columns", "output_aliases"}:
+    tables in FROM/JOIN lists, alias -> table (None for subqueries and CTEs), names
+    of subqueries/CTEs, (qualifier, column) pairs, bare column names and SELECT-list
+    aliases. Keywords and double-quoted strings count as identifiers only when they
+    are in `known` (sqlparse lexes names like `year` as keywords, and SQLite reads
+    an unknown "x" as a string).
+    """
+    tokens = []
+    for ttype, value in Lexer.get_default_instance().get_tokens(sql):
+        if ttype in Whitespace or ttype in Comment:
+            continue
+        lowered = value.lower()
+        if ttype in Name and ttype not in Name.Builtin and ttype not in Name.Placeholder:
+            tokens.append(("name", _unquote(value)))
+        elif (ttype is Keyword or ttype is String.Symbol) and lowered not in _CLAUSE_KEYWORDS \
+                and _unquote(value) in known:
+            tokens.append(("name", _unquote(value)))
+        elif ttype in Punctuation and value in "(),.":
+            tokens.append((value, value))
+        elif ttype in Wildcard:
+            tokens.append(("*", value))
+        elif ttype in Keyword or ttype in DML:
+            tokens.append(("keyword", " ".join(lowered.split())))
+        else:
+            tokens.append(("other", value))
+
+    tables, aliases, derived = set(), {}, set()
+    qualified, columns, output_aliases = [], set(), set()
+    parens = []              # per open "(": True when it opened a subquery in a FROM list
+    from_depth = None        # paren depth of the FROM/JOIN list being read
+    expect_table = False
+    alias_for = False        # the table reference that a following name would alias
+    i, n = 0, len(tokens)
+    while i < n:
+        kind, value = tokens[i]
+        nxt = tokens[i + 1][0] if i + 1 < n else None
+
+        if alias_for is not False:
+            if kind == "keyword" and value == "as":
+                i += 1
+                continue
+            if kind == "name":
+                aliases[value] = alias_for
+                if alias_for is None:
+                    derived.add(value)
+                alias_for = False
+                i += 1
+                continue
+            alias_for = False
+
+        if kind == "keyword":
+            if value == "from" or value.endswith("join"):
+                from_depth, expect_table = len(parens), True
+            elif value != "as":
+                from_depth, expect_table = None, False
+        elif kind == "(":
+            parens.append(expect_table)
+            expect_table = False
+        elif kind == ")":
+            if parens and parens.pop():
+                alias_for = None
+                from_depth, expect_table = len(parens), False
+        elif kind == ",":
+            expect_table = from_depth == len(parens)
+        elif kind == "name":
+            if expect_table:
+                tables.add(value)
+                alias_for = value
+                expect_table = False
+            elif nxt == "." and i + 2 < n and tokens[i + 2][0] in ("name", "*"):
+                qualified.append((value, tokens[i + 2][1] if tokens[i + 2][0] == "name" else "*"))
+                i += 3
+                continue
+            elif nxt == "(":
+                pass  # function call
+            elif nxt == "keyword" and tokens[i + 1][1] == "as" and i + 2 < n and tokens[i + 2][0] == "(":
+                derived.add(value)  # WITH name AS (...)
+                aliases[value] = None
+            elif i > 0 and tokens[i - 1] == ("keyword", "as"):
+                output_aliases.add(value)
+            else:
+                columns.add(value)
+        i += 1
+
+    return {"tables": tables, "aliases": aliases, "derived": derived, "qualified": qualified,
+            "columns": columns, "output_aliases": output_aliases}
+
+
+class SchemaValidator:
+    """
+    Table/column checker precompiled for one database: frozen lowercase identifier
+    sets and a per-table column map, built once. `problems` resolves aliases and
+    `table.column` qualification, so a column must exist in the table it names;
+    bare columns must exist in one of the tables the query reads.
+    """
+
+    def __init__(self, db_schema: Dict):
+        self.table_columns = {
+            table.lower(): frozenset(col.lower() for col in cols)
+            for table, cols in db_schema["table_columns"].items()
+        }
+        self.tables = frozenset(table.lower() for table in db_schema["tables"])
+        self.columns = frozenset().union(*self.table_columns.values())
+        self.known = self.tables | self.columns
+
+    def problems(self, sql: str) -> Dict[str, List[str]]:
+        """Unknown tables and columns used by `sql` ({"tables": [...], "columns": [...]})."""
+        found = scan_identifiers(sql, self.known)
+        derived = found["derived"]
+        bad_tables = sorted(t for t in found["tables"] if t not in self.tables and t not in derived)
+
+        bad_columns = []
+        for qualifier, col in found["qualified"]:
+            if qualifier in found["aliases"]:
+                table = found["aliases"][qualifier]
+            elif qualifier in self.tables:
+                table = qualifier
+            else:
+                bad_tables.append(qualifier)
+                continue
+            if table is None or table in derived or col == "*":
+                continue
+            if col not in self.table_columns.get(table, ()):
+                bad_columns.append(f"{qualifier}.{col}")
+
+        used = [self.table_columns[t] for t in found["tables"] if t in self.table_columns]
+        in_scope = frozenset().union(*used) if used else self.columns
+        for col in found["columns"]:
+            if col in in_scope or col in found["output_aliases"] or col in found["aliases"]:
+                continue
+            # Columns projected by subqueries and CTEs are not tracked.
+            if derived:
+                continue
+            bad_columns.append(col)
+
+        return {"tables": sorted(set(bad_tables)), "columns": sorted(set(bad_columns))}
+
+    def validate(self, sql: str) -> bool:
+        found = self.problems(sql)
+        return not found["tables"] and not found["columns"]
+
+
+class SchemaValidatorCache:
+    """
+    SchemaValidators per db_id; entries are built on first use and rebuilt when
+    called with a different schema object (a replaced schema).
     """
-    tables_in_sql, columns_in_sql = get_tables_and_columns_from_sql(sql)
 
-    schema_tables = set(table.lower() for table in db_schema["tables"])
-    schema_columns = set()
-    for cols in db_schema["table_columns"].values():
-        for col in cols:
-            schema_columns.add(col.lower())
+    def __init__(self):
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_id: str, db_schema: Dict) -> SchemaValidator:
+        with self._lock:
+            entry = self._validators.get(db_id)
+            if entry is not None and entry[0] is db_schema:
+                return entry[1]
+        validator = SchemaValidator(db_schema)
+        with self._lock:
+            self._validators[db_id] = (db_schema, validator)
+        return validator
+
+    def invalidate(self, db_id: str):
+        with self._lock:
+            self._validators.pop(db_id, None)
 
-    tables_valid = tables_in_sql.issubset(schema_tables)
-    columns_valid = columns_in_sql.issubset(schema_columns)
+    def __len__(self) -> int:
+        return len(self._validators)
+
+
+# Validators for schema dicts passed to validate_sql_against_schema, keyed by identity.
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def validate_sql_against_schema(sql: str, db_schema: Dict) -> bool:
+    """
+    Validates that all tables and columns used in SQL exist in the schema.
+    """
+    with _compiled_lock:
+        entry = _compiled.get(id(db_schema))
+        if entry is None or entry[0] is not db_schema:
+            if len(_compiled) >= 1024:
+                _compiled.clear()
+            entry = _compiled[id(db_schema)] = (db_schema, SchemaValidator(db_schema))
+    found = entry[1].problems(sql)
 
-    if not tables_valid:
-        print(f"❌ Invalid tables used: {tables_in_sql - schema_tables}")
-    if not columns_valid:
-        print(f"❌ Invalid columns used: {columns_in_sql - schema_columns}")
+    if found["tables"]:
+        print(f"❌ Invalid tables used: {set(found['tables'])}")
+    if found["columns"]:
+        print(f"❌ Invalid columns used: {set(found['columns'])}")
 
-    return tables_valid and columns_valid
\ No newline at end of file
+    return not found["tables"] and not found["columns"]
@@ -1,6 +1,22 @@
-from sentence_transformers import util
+import logging
+from models.schema_index import normalize_rows
+
+def is_question_relevant_to_schema(question, schema_text, model, threshold=0.35, schema_embeddings=None,
+                                   question_embedding=None):
+    """
+    `schema_embeddings` are the precomputed, normalized embeddings of the schema
+    lines (see SubSchemaIndex.line_embeddings); without them every line is re-encoded.
+    `question_embedding` is the request's normalized question embedding, if already computed.
+    """
+    if schema_embeddings is not None:
+        if question_embedding is None:
+            question_embedding = normalize_rows(model.encode(question, convert_to_numpy=True))
+        max_score = float((schema_embeddings @ question_embedding).max())
+        logging.debug(f"🔍 Max schema similarity score: {max_score:.3f}")
+        return max_score >= threshold
+
+    from sentence_transformers import util
 
-def is_question_relevant_to_schema(question, schema_text, model, threshold=0.35):
     question_embedding = model.encode(question, convert_to_tensor=True)
 
     schema_lines = schema_text.lower().splitlines()
@@ -10,5 +26,5 @@ def is_question_relevant_to_schema(question, schema_text, model, threshold=0.35)
     similarity = util.cos_sim(question_embedding, schema_embeddings)
     max_score = similarity.max().item()
 
-    print(f"🔍 Max schema similarity score: {max_score:.3f}")
+    logging.debug(f"🔍 Max schema similarity score: {max_score:.3f}")
     return max_score >= threshold
\ No newline at end of file
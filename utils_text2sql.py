@@ -1,38 +1,99 @@
 import os
 import re
+import logging
 import torch
-from transformers import T5Tokenizer, T5Config, T5ForConditionalGeneration
-from torch.serialization import safe_globals
+from functools import lru_cache
+from typing import List
 
 # Calculate absolute paths relative to this file.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 tokenizer_path = os.path.join(BASE_DIR, "text2sql_model", "text2sql_tokenizer")
 model_path = os.path.join(BASE_DIR, "text2sql_model", "text2sql_full_model.pt")
 
-# Debug prints to verify paths and file existence.
-print("Current working directory:", os.getcwd())
-print("Tokenizer path:", tokenizer_path)
-print("Model path:", model_path)
-print("Contents of tokenizer directory:", os.listdir(tokenizer_path))
-print("Contents of model directory:", os.listdir(os.path.join(BASE_DIR, "text2sql_model")))
-assert os.path.exists(model_path), "Model file not found!"
+# Exports written by export_text2sql_model.py. When the safetensors export exists it is
+# loaded (memory-mapped) instead of unpickling the full checkpoint.
+safetensors_dir = os.getenv("T5_SAFETENSORS_DIR", os.path.join(BASE_DIR, "text2sql_model", "safetensors"))
+onnx_dir = os.getenv("T5_ONNX_DIR", os.path.join(BASE_DIR, "text2sql_model", "onnx"))
 
-# 1. Load the T5 tokenizer from the tokenizer directory.
-tokenizer = T5Tokenizer.from_pretrained(tokenizer_path, local_files_only=True)
-
-# 2. Load the configuration from the tokenizer directory.
-config = T5Config.from_pretrained(tokenizer_path, local_files_only=True)
-
-# 3. Load the full model checkpoint (saved via torch.save(model, ...)).
-with safe_globals({"transformers.models.t5.modeling_t5.T5ForConditionalGeneration": T5ForConditionalGeneration}):
-    model = torch.load(model_path, map_location=torch.device("cpu"), weights_only=False)
-model.eval()
+# Inference backend: "torch" (fp32 eager), "int8" (dynamically quantized Linear layers,
+# CPU only) or "onnx" (ONNX Runtime, CPU, needs optimum[onnxruntime]).
+T5_BACKEND = os.getenv("T5_BACKEND", "torch")
+BACKENDS = ("torch", "int8", "onnx")
 
 # Generation configuration parameters.
 MAX_INPUT_LEN = 256
 MAX_OUTPUT_LEN = 128
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(DEVICE)
+
+def load_pickled_model():
+    """Restore the original checkpoint, saved via torch.save(model, ...)."""
+    from transformers import T5ForConditionalGeneration
+    from torch.serialization import safe_globals
+
+    logging.debug(f"Model path: {model_path}")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at: {model_path}")
+    with safe_globals({"transformers.models.t5.modeling_t5.T5ForConditionalGeneration": T5ForConditionalGeneration}):
+        return torch.load(model_path, map_location=torch.device("cpu"), weights_only=False)
+
+def load_torch_model():
+    """fp32 T5 on CPU, from the safetensors export when present, else from the pickle."""
+    from transformers import T5ForConditionalGeneration
+
+    if os.path.exists(os.path.join(safetensors_dir, "model.safetensors")):
+        logging.debug(f"Model path: {safetensors_dir}")
+        model = T5ForConditionalGeneration.from_pretrained(safetensors_dir, local_files_only=True)
+    else:
+        model = load_pickled_model()
+    return model.eval()
+
+def load_model(backend: str = None):
+    """
+    Load the T5 tokenizer and the model for `backend` (default T5_BACKEND) on first use;
+    returns (tokenizer, model). Later calls return the same objects.
+    """
+    return _load_backend(backend or T5_BACKEND)
+
+@lru_cache(maxsize=None)
+def _load_backend(backend: str):
+    from transformers import T5Tokenizer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown T5 backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    logging.debug(f"Tokenizer path: {tokenizer_path}")
+    tokenizer = T5Tokenizer.from_pretrained(tokenizer_path, local_files_only=True)
+
+    if backend == "torch":
+        model = load_torch_model().to(DEVICE)
+    elif backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(load_torch_model(), {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError:
+            raise ImportError("T5_BACKEND=onnx requires optimum[onnxruntime]")
+        if not os.path.isdir(onnx_dir):
+            raise FileNotFoundError(f"ONNX export not found at: {onnx_dir} (run export_text2sql_model.py --onnx)")
+        model = ORTModelForSeq2SeqLM.from_pretrained(onnx_dir, use_cache=True)
+    return tokenizer, model
+
+def export_safetensors(out_dir: str = safetensors_dir):
+    """Write the pickled checkpoint as config.json + model.safetensors."""
+    model = load_pickled_model()
+    model.save_pretrained(out_dir, safe_serialization=True)
+    return out_dir
+
+def export_onnx(out_dir: str = onnx_dir, source_dir: str = safetensors_dir):
+    """Export the safetensors checkpoint to ONNX (encoder, decoder and decoder-with-past graphs)."""
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise ImportError("ONNX export requires optimum[onnxruntime]")
+    if not os.path.exists(os.path.join(source_dir, "model.safetensors")):
+        export_safetensors(source_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(source_dir, export=True, use_cache=True)
+    model.save_pretrained(out_dir)
+    return out_dir
 
 def build_input_prompt(schema: str, question: str) -> str:
     """
@@ -68,7 +129,8 @@ def clean_generated_sql(raw_sql: str) -> str:
     
     return cleaned.strip()
 
-def generate_sql(schema: str, question: str) -> str:
+def generate_sql(schema: str, question: str, backend: str = None) -> str:
+    tokenizer, model = load_model(backend)
     prompt = build_input_prompt(schema, question)
     inputs = tokenizer(
         prompt,
@@ -78,7 +140,7 @@ def generate_sql(schema: str, question: str) -> str:
         max_length=MAX_INPUT_LEN
     )
     # Move inputs to the proper device.
-    inputs = {key: tensor.to(DEVICE) for key, tensor in inputs.items()}
+    inputs = {key: tensor.to(model.device) for key, tensor in inputs.items()}
     outputs = model.generate(
         **inputs,
         num_beams=5,
@@ -89,6 +151,40 @@ def generate_sql(schema: str, question: str) -> str:
     cleaned_sql = clean_generated_sql(raw_sql)
     return cleaned_sql
 
+def generate_sql_batch(schemas: List[str], questions: List[str], batch_size: int = 16,
+                       backend: str = None) -> List[str]:
+    """
+    Batched version of generate_sql for offline evaluation and backfills.
+
+    Prompts are tokenized once, sorted by length (longest first) and padded per batch,
+    so each batch only pads up to its own longest prompt. Results are returned in the
+    order of the inputs.
+    """
+    if len(schemas) != len(questions):
+        raise ValueError("schemas and questions must have the same length")
+    tokenizer, model = load_model(backend)
+
+    prompts = [build_input_prompt(schema, question) for schema, question in zip(schemas, questions)]
+    encoded = tokenizer(prompts, truncation=True, max_length=MAX_INPUT_LEN)["input_ids"]
+    order = sorted(range(len(prompts)), key=lambda i: len(encoded[i]), reverse=True)
+
+    results = [None] * len(prompts)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            inputs = tokenizer.pad({"input_ids": [encoded[i] for i in batch_idx]}, return_tensors="pt")
+            inputs = {key: tensor.to(model.device) for key, tensor in inputs.items()}
+            outputs = model.generate(
+                **inputs,
+                num_beams=5,
+                max_length=MAX_OUTPUT_LEN,
+                early_stopping=True
+            )
+            decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            for i, raw_sql in zip(batch_idx, decoded):
+                results[i] = clean_generated_sql(raw_sql)
+    return results
+
 # Example usage for testing.
 if __name__ == '__main__':
     schema = (